@@ -0,0 +1,82 @@
+import gzip
+import hashlib
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+try:
+    import brotli
+except ImportError:
+    # Opcional: sin el paquete brotli solo se generan las copias .gz
+    brotli = None
+
+# Tipos de archivo estático que vale la pena comprimir
+EXTENSIONES_COMPRIMIBLES = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map', '.ico')
+
+
+@deconstructible
+class AlmacenamientoPorContenido(FileSystemStorage):
+    """Guarda cada archivo con el hash SHA-256 de su contenido como nombre.
+
+    Subir dos veces el mismo archivo (aunque se llame distinto) reutiliza el
+    blob existente en vez de crear una copia con sufijo aleatorio.
+    """
+
+    def nombre_por_contenido(self, name, content):
+        """productos/foto.PNG -> productos/<sha256>.png"""
+        digest = hashlib.sha256()
+        for bloque in content.chunks():
+            digest.update(bloque)
+        directorio = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return f'{directorio}/{digest.hexdigest()}{extension}'.lstrip('/')
+
+    def _save(self, name, content):
+        nombre = self.nombre_por_contenido(name, content)
+        if self.exists(nombre):
+            return nombre
+        return super()._save(nombre, content)
+
+
+class EstaticosComprimidos(ManifestStaticFilesStorage):
+    """Estáticos con el hash del contenido en el nombre y copias .gz/.br.
+
+    collectstatic deja, junto a cada archivo con hash (styles.3f2a9c.css), sus
+    versiones comprimidas para que se sirvan sin comprimir en cada petición.
+
+    Con DEBUG = False hay que ejecutar collectstatic en cada despliegue. Si
+    falta (o un archivo no está en el manifiesto) las páginas no fallan: el
+    archivo se enlaza con su nombre sin hash.
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Ni en el manifiesto ni en STATIC_ROOT: collectstatic no se ha ejecutado
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for nombre in set(self.hashed_files.values()):
+            if nombre.lower().endswith(EXTENSIONES_COMPRIMIBLES):
+                self._comprimir(nombre)
+
+    def _comprimir(self, nombre):
+        ruta = self.path(nombre)
+        with open(ruta, 'rb') as archivo:
+            datos = archivo.read()
+        # mtime=0: la misma entrada produce siempre el mismo .gz
+        copias = {'.gz': gzip.compress(datos, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            copias['.br'] = brotli.compress(datos, quality=11)
+        for extension, comprimido in copias.items():
+            # Solo si compensa: archivos ya comprimidos o muy pequeños no ganan nada
+            if len(comprimido) < len(datos) * 0.9:
+                with open(ruta + extension, 'wb') as archivo:
+                    archivo.write(comprimido)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AppLuzzenConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_luzzen'
+
+    def ready(self):
+        # Registrar las señales que mantienen sincronizados los índices
+        from . import signals  # noqa: F401
@@ -0,0 +1,180 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+# No todas las instalaciones de Python registran WebP
+mimetypes.add_type('image/webp', '.webp')
+
+# Nombres con el hash del contenido (almacenamiento por contenido y sus
+# derivadas): el contenido de esa URL no cambia nunca
+NOMBRE_CON_HASH = re.compile(r'(^|/)[0-9a-f]{64}(_[a-z]+)?\.[a-z0-9]+$')
+
+# Estáticos de collectstatic con hash del contenido: styles.3f2a9c0b1d4e.css
+ESTATICO_CON_HASH = re.compile(r'\.[0-9a-f]{12}\.[A-Za-z0-9]+$')
+
+# Codificaciones precomprimidas, en orden de preferencia: token -> extensión
+CODIFICACIONES = (('br', '.br'), ('gzip', '.gz'))
+
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_REVALIDAR = 'public, max-age=3600'
+
+_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _Tramo:
+    """Lector que entrega solo `longitud` bytes a partir de la posición actual"""
+
+    def __init__(self, archivo, longitud):
+        self.archivo = archivo
+        self.restante = longitud
+
+    def read(self, tamano=-1):
+        if self.restante <= 0:
+            return b''
+        if tamano < 0 or tamano > self.restante:
+            tamano = self.restante
+        datos = self.archivo.read(tamano)
+        self.restante -= len(datos)
+        return datos
+
+    def close(self):
+        self.archivo.close()
+
+
+def _etag(ruta_relativa, estado):
+    # Con hash en el nombre el ETag es el propio contenido; si no, tamaño + mtime
+    coincidencia = NOMBRE_CON_HASH.search(ruta_relativa)
+    if coincidencia:
+        return quote_etag(os.path.basename(ruta_relativa).split('.')[0])
+    return quote_etag(f'{estado.st_size:x}-{estado.st_mtime_ns:x}')
+
+
+def _leer_rango(cabecera, tamano):
+    """(inicio, fin) inclusivo, None si no hay rango utilizable o 'invalido' si no se puede servir"""
+    coincidencia = _RANGO.match(cabecera.strip()) if cabecera else None
+    if not coincidencia:
+        # Sin rango, o varios rangos (se responde con el archivo completo)
+        return None
+    inicio, fin = coincidencia.groups()
+    if not inicio and not fin:
+        return None
+    if not inicio:
+        # bytes=-N: los últimos N bytes
+        longitud = int(fin)
+        if longitud == 0:
+            return 'invalido'
+        return max(tamano - longitud, 0), tamano - 1
+    inicio = int(inicio)
+    fin = min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return 'invalido'
+    return inicio, fin
+
+
+def servir_archivo(request, raiz, ruta, cache_control=None, nombre_real=None):
+    """Sirve un archivo de `raiz` con validadores, respuestas 304 y rangos de bytes.
+
+    El archivo completo se entrega con FileResponse, que el servidor WSGI puede
+    enviar con sendfile sin pasar los datos por Python. `nombre_real` permite
+    servir otro archivo (p. ej. una versión comprimida) bajo la misma URL.
+    """
+    try:
+        ruta_completa = safe_join(raiz, nombre_real or ruta)
+    except SuspiciousFileOperation:
+        raise Http404('Archivo no encontrado')
+    try:
+        estado = os.stat(ruta_completa)
+    except OSError:
+        raise Http404('Archivo no encontrado')
+    if not stat.S_ISREG(estado.st_mode):
+        raise Http404('Archivo no encontrado')
+
+    etag = _etag(ruta, estado)
+    if cache_control is None:
+        cache_control = CACHE_INMUTABLE if NOMBRE_CON_HASH.search(ruta) else CACHE_REVALIDAR
+    cabeceras = {
+        'ETag': etag,
+        'Last-Modified': http_date(estado.st_mtime),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+    }
+
+    condicional = get_conditional_response(request, etag=etag, last_modified=int(estado.st_mtime))
+    if condicional is not None:
+        for cabecera, valor in cabeceras.items():
+            condicional[cabecera] = valor
+        return condicional
+
+    content_type = mimetypes.guess_type(ruta)[0] or 'application/octet-stream'
+    tamano = estado.st_size
+    rango = None
+    if request.method == 'GET':
+        # If-Range: el rango solo vale si el cliente tiene la misma versión
+        si_rango = request.headers.get('If-Range')
+        if not si_rango or si_rango == etag:
+            rango = _leer_rango(request.headers.get('Range'), tamano)
+
+    if rango == 'invalido':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{tamano}'
+        return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = tamano
+    elif rango:
+        inicio, fin = rango
+        archivo = open(ruta_completa, 'rb')
+        archivo.seek(inicio)
+        response = FileResponse(_Tramo(archivo, fin - inicio + 1), status=206, content_type=content_type)
+        response['Content-Length'] = fin - inicio + 1
+        response['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+    else:
+        response = FileResponse(open(ruta_completa, 'rb'), content_type=content_type)
+
+    for cabecera, valor in cabeceras.items():
+        response[cabecera] = valor
+    return response
+
+
+def servir_media(request, ruta):
+    """Archivos subidos (MEDIA_ROOT)"""
+    return servir_archivo(request, settings.MEDIA_ROOT, ruta)
+
+
+def _acepta(request, codificacion):
+    for parte in request.headers.get('Accept-Encoding', '').split(','):
+        token, _, parametros = parte.strip().partition(';')
+        if token.strip().lower() == codificacion:
+            return parametros.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def servir_estatico(request, ruta):
+    """Archivos de collectstatic (STATIC_ROOT), con la mejor versión precomprimida que acepte el cliente"""
+    cache_control = CACHE_INMUTABLE if ESTATICO_CON_HASH.search(ruta) else CACHE_REVALIDAR
+    for codificacion, extension in CODIFICACIONES:
+        if not _acepta(request, codificacion):
+            continue
+        try:
+            existe = os.path.isfile(safe_join(settings.STATIC_ROOT, ruta + extension))
+        except SuspiciousFileOperation:
+            raise Http404('Archivo no encontrado')
+        if existe:
+            response = servir_archivo(
+                request, settings.STATIC_ROOT, ruta, cache_control, nombre_real=ruta + extension
+            )
+            response['Content-Encoding'] = codificacion
+            break
+    else:
+        response = servir_archivo(request, settings.STATIC_ROOT, ruta, cache_control)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
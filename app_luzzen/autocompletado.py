@@ -0,0 +1,134 @@
+import bisect
+import threading
+import time
+
+from django.core.cache import caches
+
+from .models import Categoria, Marca, Producto
+from .texto import normalizar
+
+# Índice de prefijos en memoria para el autocompletado del buscador.
+# Cada entrada es (clave, tipo, id, texto) y la lista se mantiene ordenada por clave,
+# de modo que un prefijo se resuelve con una búsqueda binaria sin tocar la base de datos.
+# Cada nombre se indexa desde cada una de sus palabras ("colgante moderna" también
+# aparece al escribir "mod").
+_entradas = []
+_por_objeto = {}
+_cargado = False
+_lock = threading.Lock()
+
+LIMITE_SUGERENCIAS = 8
+
+# Cada proceso tiene su propio índice. Los cambios cambian además esta versión
+# en la caché compartida 'versiones': un proceso cuya versión no coincide (el cambio se hizo
+# en otro worker o en un comando) reconstruye el índice en la siguiente consulta
+CLAVE_VERSION = 'autocompletado:version'
+_version = None
+
+# Segundos tras los que el índice se reconstruye aunque nadie haya avisado
+# (cambios hechos con update(), que no lanzan señales)
+DURACION_INDICE = 60 * 10
+_cargado_en = 0.0
+
+
+def _claves(texto):
+    palabras = normalizar(texto).split()
+    return [' '.join(palabras[i:]) for i in range(len(palabras))]
+
+
+def _insertar(tipo, objeto_id, texto):
+    nuevas = [(clave, tipo, objeto_id, texto) for clave in _claves(texto)]
+    for entrada in nuevas:
+        bisect.insort(_entradas, entrada)
+    _por_objeto[(tipo, objeto_id)] = nuevas
+
+
+def _quitar(tipo, objeto_id):
+    for entrada in _por_objeto.pop((tipo, objeto_id), []):
+        posicion = bisect.bisect_left(_entradas, entrada)
+        if posicion < len(_entradas) and _entradas[posicion] == entrada:
+            del _entradas[posicion]
+
+
+def cargar():
+    """Construye el índice completo desde la base de datos"""
+    global _entradas, _cargado, _version, _cargado_en
+    # Se lee antes de consultar: un cambio durante la carga provoca otra
+    version = caches['versiones'].get(CLAVE_VERSION)
+    entradas = []
+    por_objeto = {}
+    fuentes = [
+        ('producto', Producto.objects.filter(activo=True)),
+        ('marca', Marca.objects.all()),
+        ('categoria', Categoria.objects.all()),
+    ]
+    for tipo, queryset in fuentes:
+        for objeto_id, nombre in queryset.values_list('id', 'nombre').iterator():
+            nuevas = [(clave, tipo, objeto_id, nombre) for clave in _claves(nombre)]
+            entradas.extend(nuevas)
+            por_objeto[(tipo, objeto_id)] = nuevas
+    entradas.sort()
+
+    with _lock:
+        _entradas = entradas
+        _por_objeto.clear()
+        _por_objeto.update(por_objeto)
+        _cargado = True
+        _version = version
+        _cargado_en = time.monotonic()
+
+
+def actualizar(tipo, objeto_id, texto=None):
+    """Reemplaza (o elimina, si texto es None) las entradas de un objeto.
+
+    Avisa además a los demás procesos cambiando la versión compartida.
+    """
+    global _cargado, _version
+    versiones = caches['versiones']
+    anterior = versiones.get(CLAVE_VERSION)
+    nueva = time.time_ns()
+    versiones.set(CLAVE_VERSION, nueva, None)
+    with _lock:
+        # Si aún no se ha cargado, la carga inicial ya leerá el estado nuevo
+        if not _cargado:
+            return
+        if anterior != _version:
+            # A este índice le faltan cambios de otro proceso: mejor cargarlo entero
+            _cargado = False
+            return
+        _quitar(tipo, objeto_id)
+        if texto:
+            _insertar(tipo, objeto_id, texto)
+        _version = nueva
+
+
+def _vigente():
+    return (
+        _cargado
+        and time.monotonic() - _cargado_en < DURACION_INDICE
+        and caches['versiones'].get(CLAVE_VERSION) == _version
+    )
+
+
+def sugerir(prefijo, limite=LIMITE_SUGERENCIAS):
+    """Devuelve [(tipo, id, texto)] cuyos nombres tienen alguna palabra que empieza por el prefijo"""
+    if not _vigente():
+        cargar()
+
+    clave = normalizar(prefijo)
+    if not clave:
+        return []
+
+    resultados = []
+    vistos = set()
+    with _lock:
+        posicion = bisect.bisect_left(_entradas, (clave,))
+        while posicion < len(_entradas) and len(resultados) < limite:
+            entrada_clave, tipo, objeto_id, texto = _entradas[posicion]
+            if not entrada_clave.startswith(clave):
+                break
+            if (tipo, objeto_id) not in vistos:
+                vistos.add((tipo, objeto_id))
+                resultados.append((tipo, objeto_id, texto))
+            posicion += 1
+    return resultados
@@ -0,0 +1,189 @@
+import math
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, F, Func, Value, FloatField, Count, Case, When
+
+from .models import Producto, ProductoTrigrama
+from .texto import normalizar, trigramas, trigramas_palabra, similitud_palabras
+
+# Índice de texto completo (SQLite FTS5) sobre los productos
+TABLA_FTS = 'app_luzzen_producto_fts'
+
+# Pesos BM25 por columna: nombre, descripcion, categoria, marca, material
+PESOS_BM25 = (10.0, 1.0, 4.0, 4.0, 2.0)
+
+# Búsqueda tolerante a errores: similitud mínima y tope de candidatos
+SIMILITUD_MINIMA = getattr(settings, 'BUSQUEDA_SIMILITUD_MINIMA', 0.3)
+MAX_CANDIDATOS = getattr(settings, 'BUSQUEDA_MAX_CANDIDATOS', 200)
+
+SQL_CREAR_INDICE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+    nombre, descripcion, categoria, marca, material,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+SQL_INDEXAR = f"""
+INSERT INTO {TABLA_FTS} (rowid, nombre, descripcion, categoria, marca, material)
+SELECT p.id, p.nombre, p.descripcion, c.nombre, m.nombre, t.nombre
+FROM app_luzzen_producto p
+JOIN app_luzzen_categoria c ON c.id = p.categoria_id
+JOIN app_luzzen_marca m ON m.id = p.marca_id
+JOIN app_luzzen_material t ON t.id = p.material_id
+"""
+
+
+def disponible():
+    """Indica si la base de datos soporta el índice FTS5"""
+    return connection.vendor == 'sqlite'
+
+
+def _reindexar(condicion, params):
+    """Borra y vuelve a insertar en el índice los productos que cumplen la condición"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLA_FTS} WHERE rowid IN '
+            f'(SELECT p.id FROM app_luzzen_producto p WHERE {condicion})',
+            params,
+        )
+        cursor.execute(f'{SQL_INDEXAR} WHERE {condicion}', params)
+
+
+def indexar_producto(producto_id):
+    """Actualiza la entrada de un producto en el índice"""
+    if disponible():
+        _reindexar('p.id = %s', [producto_id])
+
+
+def indexar_por_relacion(campo, valor):
+    """Reindexa los productos de una categoría, marca o material"""
+    if disponible():
+        _reindexar(f'p.{campo}_id = %s', [valor])
+
+
+def eliminar_producto(producto_id):
+    """Quita un producto del índice"""
+    if disponible():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLA_FTS} WHERE rowid = %s', [producto_id])
+
+
+def reconstruir_indice():
+    """Vacía el índice y lo vuelve a poblar con todos los productos"""
+    if not disponible():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_CREAR_INDICE)
+        cursor.execute(f'DELETE FROM {TABLA_FTS}')
+        cursor.execute(SQL_INDEXAR)
+        cursor.execute(f"INSERT INTO {TABLA_FTS} ({TABLA_FTS}) VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM {TABLA_FTS}')
+        return cursor.fetchone()[0]
+
+
+def indexar_trigramas(producto):
+    """Regenera las filas de trigramas de un producto"""
+    with transaction.atomic():
+        ProductoTrigrama.objects.filter(producto_id=producto.id).delete()
+        ProductoTrigrama.objects.bulk_create([
+            ProductoTrigrama(producto_id=producto.id, trigrama=trigrama)
+            for trigrama in trigramas(producto.nombre_normalizado)
+        ])
+
+
+def reconstruir_trigramas():
+    """Regenera el índice de trigramas de todo el catálogo"""
+    with transaction.atomic():
+        ProductoTrigrama.objects.all().delete()
+        filas = (
+            ProductoTrigrama(producto_id=producto_id, trigrama=trigrama)
+            for producto_id, nombre in Producto.objects.values_list('id', 'nombre_normalizado').iterator()
+            for trigrama in trigramas(nombre)
+        )
+        ProductoTrigrama.objects.bulk_create(filas, batch_size=1000)
+    return ProductoTrigrama.objects.count()
+
+
+def buscar_similares(texto, umbral=None):
+    """Devuelve [(producto_id, similitud)] ordenados de mayor a menor similitud"""
+    umbral = SIMILITUD_MINIMA if umbral is None else umbral
+    palabras = [trigramas_palabra(palabra) for palabra in normalizar(texto).split()]
+    if not palabras:
+        return []
+    consulta = set().union(*palabras)
+
+    # Para llegar al umbral alguna palabra debe compartir al menos umbral * sus trigramas,
+    # así que los productos con menos trigramas en común se descartan en SQL
+    minimo = max(1, math.ceil(umbral * min(len(palabra) for palabra in palabras)))
+    candidatos = (
+        ProductoTrigrama.objects.filter(trigrama__in=consulta)
+        .values('producto_id')
+        .annotate(comunes=Count('id'))
+        .filter(comunes__gte=minimo)
+        .order_by('-comunes')[:MAX_CANDIDATOS]
+    )
+    ids = [fila['producto_id'] for fila in candidatos]
+
+    resultados = []
+    for producto_id, nombre in Producto.objects.filter(id__in=ids).values_list('id', 'nombre_normalizado'):
+        valor = similitud_palabras(texto, nombre)
+        if valor >= umbral:
+            resultados.append((producto_id, valor))
+    resultados.sort(key=lambda par: (-par[1], par[0]))
+    return resultados
+
+
+def filtrar_similares(productos, texto):
+    """Filtra por similitud de trigramas; la relevancia es la similitud negada"""
+    similares = buscar_similares(texto)
+    if not similares:
+        return productos.none().annotate(relevancia=Value(0.0, output_field=FloatField()))
+    return productos.filter(id__in=[producto_id for producto_id, _ in similares]).annotate(
+        relevancia=Case(
+            *[When(id=producto_id, then=Value(-valor)) for producto_id, valor in similares],
+            output_field=FloatField(),
+        )
+    )
+
+
+def construir_consulta(texto):
+    """Convierte el texto del usuario en una consulta FTS5 segura (prefijos con AND implícito)"""
+    palabras = re.findall(r'\w+', texto or '')
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+def filtrar(productos, texto):
+    """Filtra un queryset de productos por texto y anota su relevancia (menor es mejor)"""
+    sin_ranking = Value(0.0, output_field=FloatField())
+    consulta = construir_consulta(texto)
+    if not consulta:
+        return productos.annotate(relevancia=sin_ranking)
+
+    if disponible():
+        # JOIN con la tabla FTS (modelo ProductoFTS): SQLite recorre primero las
+        # coincidencias del índice y bm25() se calcula una vez por consulta
+        resultado = productos.filter(fts__documento__coincide=consulta).annotate(
+            relevancia=Func(
+                F('fts__documento'), *[Value(peso) for peso in PESOS_BM25],
+                function='bm25', output_field=FloatField(),
+            )
+        )
+    else:
+        # Otros motores: búsqueda simple sin ranking
+        resultado = productos
+        for palabra in re.findall(r'\w+', texto):
+            resultado = resultado.filter(
+                Q(nombre__icontains=palabra) |
+                Q(descripcion__icontains=palabra) |
+                Q(categoria__nombre__icontains=palabra) |
+                Q(marca__nombre__icontains=palabra) |
+                Q(material__nombre__icontains=palabra)
+            )
+        resultado = resultado.annotate(relevancia=sin_ranking)
+
+    # Sin coincidencias exactas: se prueba con trigramas (errores de tecleo)
+    if not resultado.exists():
+        return filtrar_similares(productos, texto)
+    return resultado
@@ -0,0 +1,25 @@
+import itertools
+
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class CacheArchivos(FileBasedCache):
+    """FileBasedCache que no recorre el directorio en cada escritura.
+
+    FileBasedCache cuenta los archivos (un glob de todo el directorio) antes de
+    cada set() para decidir si borra entradas; con decenas de miles de
+    entradas son decenas de milisegundos por escritura. Aquí solo se cuenta
+    cada LIMPIAR_CADA escrituras de cada proceso, así que la caché puede pasar
+    de MAX_ENTRIES como mucho en esas escrituras. Con LIMPIAR_CADA = 0 no se
+    borra nunca nada (para cachés con pocas claves que no deben perderse).
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._limpiar_cada = int(params.get('OPTIONS', {}).get('LIMPIAR_CADA', 1000))
+        self._escrituras = itertools.count(1)
+
+    def _cull(self):
+        if not self._limpiar_cada or next(self._escrituras) % self._limpiar_cada:
+            return
+        super()._cull()
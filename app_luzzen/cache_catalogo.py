@@ -0,0 +1,255 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.urls import reverse
+
+# Sello de versión del catálogo. Forma parte de la clave de los fragmentos
+# cacheados (tarjetas de producto y páginas completas), así que al cambiarlo todos quedan obsoletos
+# sin tener que borrarlos uno a uno. Vive en la caché 'versiones', compartida
+# por todos los procesos y que nunca descarta claves, así que los cambios hechos
+# desde un comando también cuentan.
+CLAVE_VERSION = 'catalogo:version'
+
+# Duración de los fragmentos de las tarjetas en caché (segundos)
+DURACION_TARJETAS = 60 * 60 * 24
+
+# Duración de las páginas completas cacheadas para visitantes anónimos
+DURACION_PAGINAS = 60 * 10
+
+# Duración de los datos de las vistas cacheados con obtener()
+DURACION_DATOS = 60 * 5
+
+# Segundos durante los que se sigue sirviendo un valor caducado mientras otro
+# proceso lo recalcula
+GRACIA = getattr(settings, 'CACHE_GRACIA', 30)
+
+# Candados entre procesos del mismo equipo: un archivo creado en exclusiva por clave
+DIRECTORIO_CANDADOS = getattr(
+    settings, 'CACHE_DIRECTORIO_CANDADOS', os.path.join(tempfile.gettempdir(), 'luzzen_candados')
+)
+# Un candado más antiguo que esto se considera abandonado (proceso caído)
+CADUCIDAD_CANDADO = 60
+# Máximo que espera una petición sin valor que servir a que otro proceso lo calcule
+ESPERA_CANDADO = 10
+
+# El token CSRF del header es distinto para cada visitante: en la caché se
+# guarda una marca y se sustituye al servir la página
+_TOKEN_CSRF = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+_MARCA_CSRF = '__token_csrf__'
+
+
+def version():
+    """Versión actual del catálogo"""
+    versiones = caches['versiones']
+    valor = versiones.get(CLAVE_VERSION)
+    if valor is None:
+        # Si la caché perdió la clave se empieza desde un valor nuevo, nunca
+        # desde uno ya usado, para no resucitar fragmentos antiguos
+        valor = time.time_ns()
+        versiones.add(CLAVE_VERSION, valor, None)
+        valor = versiones.get(CLAVE_VERSION, valor)
+    return valor
+
+
+def invalidar():
+    """Cambia la versión del catálogo"""
+    # Un valor nuevo en vez de incr(): en la caché de archivos incr() no es
+    # atómico y dos procesos podrían dejar el mismo número
+    caches['versiones'].set(CLAVE_VERSION, time.time_ns(), None)
+
+
+def invalidar_productos(producto_ids, agotados=False):
+    """Invalida lo cacheado de unos productos cuyo stock ha cambiado.
+
+    Las unidades solo se ven en el detalle del producto (datos y página sin
+    parámetros), que se borran uno a uno. Tarjetas y listados solo dependen de
+    si queda stock: el catálogo entero se invalida solo si alguno se agotó
+    (`agotados`). Lo demás que cambia con una venta (el orden por vendidos)
+    espera a que caduque.
+    """
+    if agotados:
+        invalidar()
+        return
+    claves = []
+    for producto_id in producto_ids:
+        claves.append(f'detalle_producto:{producto_id}')
+        claves.append(_clave_ruta(reverse('detalle_producto', args=[producto_id])))
+    cache.delete_many(claves)
+
+
+class Candado:
+    """Candado con nombre compartido por todos los procesos del equipo.
+
+    Protege valores de la caché por defecto, que también es compartida: quien
+    espera el candado encuentra después el valor que calculó quien lo tenía.
+    """
+
+    def __init__(self, clave):
+        os.makedirs(DIRECTORIO_CANDADOS, exist_ok=True)
+        nombre = hashlib.md5(clave.encode()).hexdigest()
+        self.ruta = os.path.join(DIRECTORIO_CANDADOS, f'{nombre}.lock')
+        # Identifica a este dueño dentro del archivo, para no liberar uno ajeno
+        self.marca = uuid.uuid4().hex.encode()
+
+    def adquirir(self, espera=0):
+        """Intenta tomar el candado durante como mucho `espera` segundos"""
+        limite = time.monotonic() + espera
+        while True:
+            try:
+                descriptor = os.open(self.ruta, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self._romper_abandonado():
+                    continue
+            else:
+                try:
+                    os.write(descriptor, self.marca)
+                finally:
+                    os.close(descriptor)
+                return True
+            if time.monotonic() >= limite:
+                return False
+            time.sleep(0.05)
+
+    def _romper_abandonado(self):
+        """Quita el candado si está abandonado; True si hay que volver a intentar tomarlo.
+
+        El archivo se aparta con un renombrado, que es atómico: de varios
+        procesos que lo ven abandonado a la vez solo uno se lo lleva. Si lo que
+        se llevó ya no es el archivo viejo (otro proceso lo rompió y tomó uno
+        nuevo entre medias), lo devuelve a su sitio.
+        """
+        try:
+            modificado = os.stat(self.ruta).st_mtime_ns
+        except FileNotFoundError:
+            return True
+        if time.time_ns() - modificado <= CADUCIDAD_CANDADO * 10 ** 9:
+            return False
+        apartado = f'{self.ruta}.{uuid.uuid4().hex}'
+        try:
+            os.rename(self.ruta, apartado)
+        except FileNotFoundError:
+            return True
+        try:
+            if os.stat(apartado).st_mtime_ns == modificado:
+                return True
+            try:
+                os.link(apartado, self.ruta)
+            except FileExistsError:
+                pass
+            return False
+        finally:
+            os.remove(apartado)
+
+    def liberar(self):
+        try:
+            with open(self.ruta, 'rb') as archivo:
+                propio = archivo.read() == self.marca
+            if propio:
+                os.remove(self.ruta)
+        except FileNotFoundError:
+            pass
+
+
+def obtener(clave, calcular, duracion, version_datos=None, gracia=None):
+    """Devuelve el valor cacheado de `clave`, calculándolo con `calcular()` si hace falta.
+
+    Solo un proceso recalcula cada clave a la vez (single-flight). Mientras
+    tanto el resto sirve el valor caducado si lo hay, durante `gracia` segundos
+    más allá de `duracion`; si no lo hay esperan a que el primero termine.
+    Con `version_datos` el valor también caduca cuando cambia esa versión
+    (p. ej. la del catálogo). Si `calcular()` devuelve None no se guarda nada.
+    """
+    gracia = GRACIA if gracia is None else gracia
+    guardado = cache.get(clave)
+    if guardado is not None:
+        valor, version_guardada, caduca = guardado
+        if version_guardada == version_datos and time.time() < caduca:
+            return valor
+
+    candado = Candado(clave)
+    if not candado.adquirir(0 if guardado is not None else ESPERA_CANDADO):
+        if guardado is not None:
+            # Otro proceso lo está recalculando: se sirve el valor anterior
+            return guardado[0]
+        # Se agotó la espera: se calcula sin guardar para no pisar al otro proceso
+        return calcular()
+
+    try:
+        if guardado is None:
+            # Mientras se esperaba el candado otro proceso pudo dejar el valor listo
+            guardado = cache.get(clave)
+            if guardado is not None and guardado[1] == version_datos and time.time() < guardado[2]:
+                return guardado[0]
+        valor = calcular()
+        if valor is not None:
+            cache.set(clave, (valor, version_datos, time.time() + duracion), duracion + gracia)
+        return valor
+    finally:
+        candado.liberar()
+
+
+def _clave_ruta(ruta, parametros=()):
+    firma = hashlib.md5(f'{ruta}?{urlencode(parametros)}'.encode()).hexdigest()
+    return f'pagina:{firma}'
+
+
+def _clave_pagina(request):
+    # Los parámetros se ordenan para que ?a=1&b=2 y ?b=2&a=1 compartan entrada
+    parametros = sorted(
+        (clave, valor) for clave in request.GET for valor in request.GET.getlist(clave)
+    )
+    return _clave_ruta(request.path, parametros)
+
+
+def _cacheable(request):
+    # Solo visitantes sin sesión iniciada y sin mensajes pendientes de mostrar
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.session.get('usuario_id')
+        and not len(get_messages(request))
+    )
+
+
+def cache_pagina_anonima(view_func):
+    """Cachea la página completa para visitantes anónimos.
+
+    La clave incluye la ruta y la query string; el valor guarda la versión del
+    catálogo, así que cualquier cambio en productos o taxonomías deja obsoletas
+    todas las páginas (servidas aún durante la gracia mientras se regeneran).
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable(request):
+            return view_func(request, *args, **kwargs)
+
+        no_cacheable = []
+
+        def renderizar():
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                no_cacheable.append(response)
+                return None
+            contenido = _TOKEN_CSRF.sub(rf'\g<1>{_MARCA_CSRF}\g<2>', response.content.decode())
+            return contenido, response['Content-Type']
+
+        pagina = obtener(_clave_pagina(request), renderizar, DURACION_PAGINAS, version())
+        if pagina is None:
+            # Respuesta de error o redirección: se devuelve tal cual, sin cachear
+            return no_cacheable[0]
+
+        contenido, content_type = pagina
+        if _MARCA_CSRF in contenido:
+            contenido = contenido.replace(_MARCA_CSRF, get_token(request))
+        return HttpResponse(contenido, content_type=content_type)
+    return wrapper
@@ -0,0 +1,235 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import reservas
+from .models import ItemPedido, Pedido, Producto
+
+# Acciones que acepta aplicar_lote()
+ACCIONES = ('agregar', 'cantidad', 'eliminar')
+MAX_OPERACIONES = 100
+
+# Días sin cambios tras los que un carrito se considera abandonado
+DIAS_ABANDONO = getattr(settings, 'CARRITO_DIAS_ABANDONO', 30)
+
+
+class ErrorCarrito(Exception):
+    """No se pudo modificar el carrito; el mensaje se muestra al usuario"""
+
+
+class SinStock(ErrorCarrito):
+    def __init__(self, productos=None):
+        self.productos = productos or []
+        if self.productos:
+            super().__init__(f'No hay suficiente stock de {", ".join(self.productos)}')
+        else:
+            super().__init__('No hay suficiente stock disponible')
+
+
+class OperacionInvalida(ErrorCarrito):
+    pass
+
+
+def obtener_carrito(usuario, intentos=3):
+    """Pedido pendiente del usuario, que hace de carrito.
+
+    La restricción pedido_carrito_unico impide que dos peticiones simultáneas
+    creen dos carritos: la que pierde recibe IntegrityError y lee el que creó
+    la otra. Se reintenta por si ese carrito se completó justo entre medias.
+    """
+    for _ in range(intentos):
+        pedido = Pedido.objects.filter(cliente=usuario, estado='pendiente').first()
+        if pedido is not None:
+            return pedido
+        try:
+            with transaction.atomic():
+                return Pedido.objects.create(cliente=usuario, estado='pendiente', total=0)
+        except IntegrityError:
+            continue
+    raise ErrorCarrito('No se pudo obtener el carrito, inténtalo de nuevo')
+
+
+def _bloquear(pedido):
+    # Dos peticiones del mismo carrito se aplican una tras otra (en SQLite ya
+    # lo garantiza la transacción IMMEDIATE)
+    list(Pedido.objects.select_for_update().filter(id=pedido.id).values_list('id'))
+
+
+def _reservar(pedido, cantidades):
+    faltan = reservas.reservar(pedido, cantidades)
+    if faltan:
+        raise SinStock(faltan)
+
+
+def _ajustar(pedido, importe, lineas=0):
+    """Suma `importe` al total y `lineas` al número de líneas del pedido en la base de datos.
+
+    Con F() el cambio es relativo: dos peticiones simultáneas sobre el mismo
+    carrito no se pisan, y no hace falta recorrer los artículos. El mismo
+    UPDATE anota la actividad del carrito.
+    """
+    Pedido.objects.filter(id=pedido.id).update(
+        total=F('total') + importe,
+        cantidad_items=F('cantidad_items') + lineas,
+        ultima_actividad=timezone.now(),
+    )
+    pedido.refresh_from_db(fields=['total', 'cantidad_items'])
+
+
+def agregar(pedido, producto):
+    """Añade una unidad de `producto` al carrito y la reserva; devuelve el artículo"""
+    with transaction.atomic():
+        _bloquear(pedido)
+        item, creado = ItemPedido.objects.get_or_create(
+            pedido=pedido,
+            producto=producto,
+            defaults={'cantidad': 1, 'precio_unitario': producto.precio},
+        )
+        # Si no hay unidades libres la excepción deshace también la línea recién creada
+        _reservar(pedido, {producto.id: item.cantidad if creado else item.cantidad + 1})
+        if creado:
+            _ajustar(pedido, item.precio_unitario, 1)
+            return item
+
+        ItemPedido.objects.filter(id=item.id).update(cantidad=F('cantidad') + 1)
+        _ajustar(pedido, item.precio_unitario)
+    item.refresh_from_db(fields=['cantidad'])
+    return item
+
+
+def cambiar_cantidad(item, accion):
+    """Incrementa o decrementa en una unidad la cantidad de un artículo del carrito"""
+    with transaction.atomic():
+        _bloquear(item.pedido)
+        item.refresh_from_db(fields=['cantidad'])
+        if accion == 'incrementar':
+            _reservar(item.pedido, {item.producto_id: item.cantidad + 1})
+            ItemPedido.objects.filter(id=item.id).update(cantidad=F('cantidad') + 1)
+            _ajustar(item.pedido, item.precio_unitario)
+        elif accion == 'decrementar' and item.cantidad > 1:
+            # Nunca baja de 1: para quitarlo está eliminar()
+            _reservar(item.pedido, {item.producto_id: item.cantidad - 1})
+            ItemPedido.objects.filter(id=item.id).update(cantidad=F('cantidad') - 1)
+            _ajustar(item.pedido, -item.precio_unitario)
+    item.refresh_from_db(fields=['cantidad'])
+    return item
+
+
+def eliminar(item):
+    """Quita el artículo del carrito y descuenta su importe del total"""
+    with transaction.atomic():
+        _bloquear(item.pedido)
+        # Con la cantidad leída dentro de la transacción, por si cambió mientras tanto
+        cantidad = ItemPedido.objects.filter(id=item.id).values_list('cantidad', flat=True).first()
+        if cantidad is None:
+            return
+        ItemPedido.objects.filter(id=item.id).delete()
+        reservas.reservar(item.pedido, {item.producto_id: 0})
+        _ajustar(item.pedido, -cantidad * item.precio_unitario, -1)
+
+
+def _leer_operacion(operacion):
+    try:
+        accion = operacion['accion']
+        producto_id = int(operacion['producto'])
+        cantidad = int(operacion.get('cantidad', 1))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        raise OperacionInvalida('Operación de carrito no válida')
+    if accion not in ACCIONES or cantidad < 0:
+        raise OperacionInvalida('Operación de carrito no válida')
+    return accion, producto_id, cantidad
+
+
+def aplicar_lote(pedido, operaciones):
+    """Aplica varias operaciones sobre el carrito en una sola transacción.
+
+    Cada operación es un dict {'accion', 'producto', 'cantidad'}:
+    'agregar' suma `cantidad` unidades (1 por defecto), 'cantidad' fija la
+    cantidad (0 la quita) y 'eliminar' quita el producto. Se leen los artículos
+    y productos afectados con una consulta cada uno y se escriben con
+    bulk_create/bulk_update/delete; si alguna cantidad supera las unidades
+    disponibles (stock sin reservar) no se aplica ninguna. Devuelve {producto_id: {'cantidad', 'subtotal'}} con el
+    estado final de cada producto afectado.
+    """
+    if len(operaciones) > MAX_OPERACIONES:
+        raise OperacionInvalida('Demasiadas operaciones en una sola petición')
+    pasos = [_leer_operacion(operacion) for operacion in operaciones]
+    if not pasos:
+        return {}
+    producto_ids = {producto_id for _, producto_id, _ in pasos}
+
+    with transaction.atomic():
+        _bloquear(pedido)
+        items = {
+            item.producto_id: item
+            for item in ItemPedido.objects.filter(pedido=pedido, producto_id__in=producto_ids)
+        }
+        productos = Producto.objects.in_bulk(producto_ids)
+
+        cantidades = {producto_id: item.cantidad for producto_id, item in items.items()}
+        for accion, producto_id, cantidad in pasos:
+            if producto_id not in productos:
+                raise OperacionInvalida('Producto no encontrado')
+            if accion == 'agregar':
+                cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+            elif accion == 'cantidad':
+                cantidades[producto_id] = cantidad
+            else:
+                cantidades[producto_id] = 0
+
+        _reservar(pedido, cantidades)
+
+        nuevos, modificados, borrados = [], [], []
+        importe = 0
+        resultado = {}
+        for producto_id, cantidad in cantidades.items():
+            item = items.get(producto_id)
+            precio = item.precio_unitario if item else productos[producto_id].precio
+            resultado[producto_id] = {'cantidad': cantidad, 'subtotal': cantidad * precio}
+            if item is None:
+                if cantidad:
+                    nuevos.append(ItemPedido(pedido=pedido, producto_id=producto_id, cantidad=cantidad, precio_unitario=precio))
+                    importe += cantidad * precio
+            elif cantidad == 0:
+                borrados.append(item.id)
+                importe -= item.cantidad * item.precio_unitario
+            elif cantidad != item.cantidad:
+                importe += (cantidad - item.cantidad) * item.precio_unitario
+                item.cantidad = cantidad
+                modificados.append(item)
+
+        if nuevos:
+            ItemPedido.objects.bulk_create(nuevos)
+        if modificados:
+            ItemPedido.objects.bulk_update(modificados, ['cantidad'])
+        if borrados:
+            ItemPedido.objects.filter(id__in=borrados).delete()
+        if nuevos or modificados or borrados:
+            _ajustar(pedido, importe, len(nuevos) - len(borrados))
+
+    return resultado
+
+
+def abandonados(dias=None):
+    """Carritos sin cambios desde hace más de `dias` (índice estado, ultima_actividad)"""
+    limite = timezone.now() - timedelta(days=DIAS_ABANDONO if dias is None else dias)
+    return Pedido.objects.filter(estado='pendiente', ultima_actividad__lt=limite)
+
+
+def expirar_lote(carritos, lote, desde_id=0):
+    """Borra hasta `lote` carritos de `carritos` con id mayor que `desde_id`.
+
+    Cada lote es una transacción corta; los artículos y reservas se borran en
+    cascada. Devuelve (último id visto, carritos borrados); el último id es
+    None cuando no queda nada. Como el filtro se vuelve a aplicar al borrar,
+    un carrito que recibió actividad mientras tanto se respeta.
+    """
+    ids = list(carritos.filter(id__gt=desde_id).order_by('id').values_list('id', flat=True)[:lote])
+    if not ids:
+        return None, 0
+    with transaction.atomic():
+        borrados = carritos.filter(id__in=ids).delete()[1].get(Pedido._meta.label, 0)
+    return ids[-1], borrados
@@ -0,0 +1,151 @@
+import secrets
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from . import cache_catalogo, reservas, stock_fraccionado
+from .models import Pedido, Producto, SolicitudPago
+
+
+class ErrorCheckout(Exception):
+    """No se pudo completar la compra; el mensaje se muestra al usuario"""
+
+
+class CarritoVacio(ErrorCheckout):
+    def __init__(self):
+        super().__init__('Tu carrito está vacío')
+
+
+class PedidoNoPendiente(ErrorCheckout):
+    def __init__(self):
+        super().__init__('Este pedido ya fue procesado')
+
+
+class StockInsuficiente(ErrorCheckout):
+    def __init__(self, productos):
+        self.productos = productos
+        if productos:
+            super().__init__(f'No hay suficiente stock de {", ".join(productos)}')
+        else:
+            super().__init__('No hay suficiente stock para completar el pedido')
+
+
+def _por_producto(valores):
+    # CASE id WHEN 1 THEN 3 WHEN 7 THEN 1 ... END
+    return Case(
+        *[When(id=producto_id, then=Value(valor)) for producto_id, valor in valores.items()],
+        output_field=IntegerField(),
+    )
+
+
+def completar_pedido(pedido):
+    """Convierte el carrito en un pedido completado descontando el stock.
+
+    Todo ocurre en una transacción: el pedido pasa a 'completado' solo si seguía
+    pendiente, y el stock de todos los productos se descuenta con un único
+    UPDATE condicionado a que el stock menos lo reservado por otros carritos
+    cubra la cantidad. Si algún producto no alcanza, no se modifica nada y se
+    lanza StockInsuficiente. Al terminar se liberan las reservas del carrito.
+
+    Los productos con stock fraccionado descuentan de sus fracciones, también
+    sin tocar lo reservado por otros carritos.
+    """
+    with transaction.atomic():
+        # Marca el pedido primero: un segundo envío del mismo carrito no descuenta dos veces
+        if not Pedido.objects.filter(id=pedido.id, estado='pendiente').update(estado='completado'):
+            raise PedidoNoPendiente()
+
+        cantidades = dict(
+            pedido.items.order_by()
+            .values('producto_id')
+            .annotate(total=Sum('cantidad'))
+            .values_list('producto_id', 'total')
+        )
+        if not cantidades:
+            raise CarritoVacio()
+
+        fraccionados = set(
+            Producto.objects.filter(id__in=cantidades, stock_fraccionado=True).values_list('id', flat=True)
+        )
+        reservado = reservas.reservado_por_producto(fraccionados, excluir_pedido=pedido) if fraccionados else {}
+        agotados_fraccionados = [
+            producto_id for producto_id in fraccionados
+            if not stock_fraccionado.descontar(producto_id, cantidades[producto_id], reservado.get(producto_id, 0))
+        ]
+
+        normales = {producto_id: total for producto_id, total in cantidades.items() if producto_id not in fraccionados}
+        actualizados = 0
+        if normales:
+            cantidad = _por_producto(normales)
+            # Las reservas propias no restan: son justo las unidades que se compran
+            necesario = cantidad + reservas.reservado(excluir_pedido=pedido)
+            actualizados = Producto.objects.filter(id__in=normales, stock__gte=necesario).update(
+                stock=F('stock') - cantidad,
+                vendidos=F('vendidos') + cantidad,
+            )
+        correcto = actualizados == len(normales) and not agotados_fraccionados
+        if not correcto:
+            # Deshace el cambio de estado y los descuentos que sí se aplicaron
+            transaction.set_rollback(True)
+        else:
+            reservas.liberar(pedido)
+            # update() no lanza señales: se invalida a mano lo que muestra el stock
+            # de estos productos. El de los fraccionados se publica al sincronizar
+            # (sincronizar_stock)
+            if normales:
+                agotados = Producto.objects.filter(id__in=normales, stock__lte=0).exists()
+                transaction.on_commit(lambda: cache_catalogo.invalidar_productos(normales, agotados))
+
+    if not correcto:
+        agotados = Producto.objects.filter(id__in=agotados_fraccionados)
+        if actualizados != len(normales):
+            agotados |= Producto.objects.filter(id__in=normales, stock__lt=necesario)
+        raise StockInsuficiente(list(agotados.order_by('nombre').values_list('nombre', flat=True)))
+
+    pedido.estado = 'completado'
+    return pedido
+
+
+def nueva_clave():
+    """Clave de idempotencia para un formulario de pago"""
+    return secrets.token_urlsafe(32)
+
+
+def pagar(usuario, clave=None):
+    """Completa el carrito del usuario una sola vez por `clave`.
+
+    Devuelve la SolicitudPago con el resultado. Si la clave ya se usó, se
+    devuelve el resultado guardado sin leer el carrito ni tocar el stock. La
+    solicitud se guarda en la misma transacción que la compra: un envío
+    simultáneo con la misma clave espera en el índice único y después recibe
+    el resultado del primero.
+    """
+    if clave:
+        anterior = SolicitudPago.objects.filter(clave=clave, cliente=usuario).first()
+        if anterior:
+            return anterior
+
+    solicitud = SolicitudPago(clave=clave or '', cliente=usuario)
+    try:
+        with transaction.atomic():
+            if clave:
+                solicitud.save()
+            pedido = Pedido.objects.filter(cliente=usuario, estado='pendiente').first()
+            try:
+                if pedido is None:
+                    raise CarritoVacio()
+                completar_pedido(pedido)
+                solicitud.pedido = pedido
+                solicitud.resultado = 'completado'
+            except ErrorCheckout as e:
+                solicitud.resultado = 'rechazado'
+                solicitud.mensaje = str(e)[:255]
+            if clave:
+                solicitud.save(update_fields=['pedido', 'resultado', 'mensaje'])
+    except IntegrityError:
+        # Otro envío con la misma clave se guardó mientras tanto
+        anterior = SolicitudPago.objects.filter(clave=clave, cliente=usuario).first()
+        if anterior is None:
+            raise ErrorCheckout('Solicitud de pago no válida')
+        return anterior
+    return solicitud
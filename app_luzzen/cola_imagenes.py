@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import TareaImagen
+
+# Reintentos de una tarea antes de marcarla como fallida
+MAX_INTENTOS = 3
+# Espera antes del primer reintento (segundos); se duplica en cada intento
+ESPERA_REINTENTO = 30
+# Una tarea 'procesando' sin cambios durante este tiempo se da por abandonada
+TIEMPO_ABANDONO = timedelta(minutes=10)
+
+
+def encolar(producto):
+    """Programa la generación de variantes de la imagen actual del producto"""
+    return TareaImagen.objects.create(producto=producto, imagen=producto.imagen.name)
+
+
+def recuperar_abandonadas():
+    """Devuelve a la cola las tareas de un worker que se detuvo a medias"""
+    return TareaImagen.objects.filter(
+        estado='procesando',
+        fecha_actualizacion__lt=timezone.now() - TIEMPO_ABANDONO,
+    ).update(estado='pendiente', fecha_actualizacion=timezone.now())
+
+
+def reclamar(limite):
+    """Marca como 'procesando' hasta `limite` tareas listas y las devuelve.
+
+    Cada tarea se reclama con un UPDATE condicionado a su estado, así que si
+    hay varios workers ninguna se procesa dos veces.
+    """
+    candidatas = (
+        TareaImagen.objects.filter(estado='pendiente', disponible_desde__lte=timezone.now())
+        .order_by('disponible_desde', 'id')
+        .values_list('id', flat=True)[:limite]
+    )
+    reclamadas = [
+        tarea_id for tarea_id in candidatas
+        if TareaImagen.objects.filter(id=tarea_id, estado='pendiente').update(
+            estado='procesando', fecha_actualizacion=timezone.now()
+        )
+    ]
+    return list(TareaImagen.objects.filter(id__in=reclamadas).select_related('producto'))
+
+
+def completar(tarea):
+    tarea.estado = 'completada'
+    tarea.error = ''
+    tarea.save(update_fields=['estado', 'error', 'fecha_actualizacion'])
+
+
+def registrar_fallo(tarea, error):
+    """Programa un reintento con espera creciente, o marca la tarea como fallida"""
+    tarea.intentos += 1
+    tarea.error = error
+    if tarea.intentos >= MAX_INTENTOS:
+        tarea.estado = 'fallida'
+    else:
+        tarea.estado = 'pendiente'
+        tarea.disponible_desde = timezone.now() + timedelta(
+            seconds=ESPERA_REINTENTO * 2 ** (tarea.intentos - 1)
+        )
+    tarea.save(update_fields=['intentos', 'error', 'estado', 'disponible_desde', 'fecha_actualizacion'])
+
+
+def anotar_estado(productos):
+    """Añade a cada producto el estado de su última tarea de imagen (estado_imagen)"""
+    ultima = TareaImagen.objects.filter(producto=OuterRef('pk')).order_by('-id')
+    return productos.annotate(estado_imagen=Subquery(ultima.values('estado')[:1]))
@@ -0,0 +1,54 @@
+from collections import defaultdict
+
+from django.db.models import Count
+
+# Facetas del catálogo: nombre del parámetro GET -> columna en Producto
+FACETAS = {
+    'categoria': 'categoria_id',
+    'marca': 'marca_id',
+    'material': 'material_id',
+}
+
+
+def leer_seleccion(query_dict):
+    """Lee los valores marcados de cada faceta (admite varios por faceta)"""
+    seleccion = {}
+    for faceta in FACETAS:
+        seleccion[faceta] = {int(valor) for valor in query_dict.getlist(faceta) if valor.isdigit()}
+    return seleccion
+
+
+def aplicar(productos, seleccion):
+    """Filtra el queryset por los valores marcados de cada faceta"""
+    for faceta, columna in FACETAS.items():
+        if seleccion[faceta]:
+            productos = productos.filter(**{f'{columna}__in': seleccion[faceta]})
+    return productos
+
+
+def contar(productos, seleccion):
+    """Cuenta productos por valor de cada faceta con una sola consulta agrupada.
+
+    El conteo de cada faceta respeta la selección de las otras dos pero no la
+    suya propia, para que se puedan seguir marcando opciones de la misma faceta.
+    Devuelve (conteos, total) donde conteos[faceta][id] es el número de productos.
+    """
+    filas = (
+        productos.order_by()
+        .values(*FACETAS.values())
+        .annotate(total=Count('id'))
+    )
+
+    conteos = {faceta: defaultdict(int) for faceta in FACETAS}
+    total = 0
+    for fila in filas:
+        coincide = {
+            faceta: not seleccion[faceta] or fila[columna] in seleccion[faceta]
+            for faceta, columna in FACETAS.items()
+        }
+        for faceta, columna in FACETAS.items():
+            if all(valor for otra, valor in coincide.items() if otra != faceta):
+                conteos[faceta][fila[columna]] += fila['total']
+        if all(coincide.values()):
+            total += fila['total']
+    return conteos, total
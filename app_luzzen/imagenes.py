@@ -0,0 +1,104 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .models import Producto
+
+# Variantes de cada imagen de producto: nombre -> ancho en píxeles
+VARIANTES = {
+    'thumb': 160,
+    'card': 400,
+    'detail': 900,
+}
+
+# Formatos generados para cada variante: extensión -> (formato de Pillow, opciones)
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+CARPETA_DERIVADAS = 'derivadas'
+
+# Los originales se guardan por contenido; las derivadas ya llevan el hash del
+# original en el nombre y van al almacenamiento normal
+_originales = Producto._meta.get_field('imagen').storage
+_derivadas = default_storage
+
+
+def ruta_derivada(nombre, variante, extension):
+    """Ruta de una derivada: productos/foto.png -> productos/derivadas/foto_card.webp"""
+    carpeta, archivo = os.path.split(nombre)
+    base = os.path.splitext(archivo)[0]
+    return f'{carpeta}/{CARPETA_DERIVADAS}/{base}_{variante}.{extension}'.lstrip('/')
+
+
+def tiene_derivadas(nombre):
+    # Se generan todas juntas: basta con comprobar la última
+    return bool(nombre) and _derivadas.exists(ruta_derivada(nombre, 'detail', 'jpg'))
+
+
+def _preparar(imagen, extension):
+    if extension == 'jpg' and imagen.mode != 'RGB':
+        # JPEG no admite transparencia: se aplana sobre fondo blanco
+        fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+        rgba = imagen.convert('RGBA')
+        fondo.paste(rgba, mask=rgba.getchannel('A'))
+        return fondo
+    if extension == 'webp' and imagen.mode not in ('RGB', 'RGBA'):
+        return imagen.convert('RGBA')
+    return imagen
+
+
+def generar_derivadas(nombre):
+    """Genera todas las variantes de la imagen original `nombre`.
+
+    Nunca se amplía una imagen más estrecha que la variante. Los metadatos
+    (EXIF, perfiles) no se copian a las derivadas. Devuelve las rutas creadas.
+    """
+    with _originales.open(nombre, 'rb') as archivo:
+        original = Image.open(archivo)
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    rutas = []
+    for variante, ancho in VARIANTES.items():
+        if original.width > ancho:
+            alto = max(1, round(original.height * ancho / original.width))
+            imagen = original.resize((ancho, alto), Image.LANCZOS)
+        else:
+            imagen = original
+        for extension, (formato, opciones) in FORMATOS.items():
+            contenido = BytesIO()
+            _preparar(imagen, extension).save(contenido, formato, **opciones)
+            ruta = ruta_derivada(nombre, variante, extension)
+            if _derivadas.exists(ruta):
+                _derivadas.delete(ruta)
+            rutas.append(_derivadas.save(ruta, ContentFile(contenido.getvalue())))
+    return rutas
+
+
+def eliminar_derivadas(nombre):
+    for variante in VARIANTES:
+        for extension in FORMATOS:
+            ruta = ruta_derivada(nombre, variante, extension)
+            if _derivadas.exists(ruta):
+                _derivadas.delete(ruta)
+
+
+def url_derivada(nombre, variante, extension):
+    return _derivadas.url(ruta_derivada(nombre, variante, extension))
+
+
+def urls_derivadas(nombre, extension):
+    """[(url, ancho)] de las variantes de un formato, de menor a mayor"""
+    return [
+        (url_derivada(nombre, variante, extension), ancho)
+        for variante, ancho in VARIANTES.items()
+    ]
+
+
+def url_original(nombre):
+    return _originales.url(nombre) if nombre else ''
@@ -0,0 +1,86 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Min, Max
+
+from app_luzzen.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Mide las consultas filtradas del catálogo y muestra su plan de ejecución'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        repeticiones = options['repeticiones']
+        activos = Producto.objects.filter(activo__in=[True])
+        producto = activos.order_by('id').first()
+        if producto is None:
+            self.stdout.write(self.style.WARNING('No hay productos activos para medir'))
+            return
+
+        # Rango de precio central de la categoría del primer producto
+        limites = activos.filter(categoria_id=producto.categoria_id).aggregate(
+            minimo=Min('precio'), maximo=Max('precio')
+        )
+        tercio = (limites['maximo'] - limites['minimo']) / 3
+        precio_min = (limites['minimo'] + tercio).quantize(Decimal('0.01'))
+        precio_max = (limites['maximo'] - tercio).quantize(Decimal('0.01'))
+
+        consultas = [
+            (
+                'Categoría + rango de precio, ordenado por precio',
+                activos.filter(
+                    categoria_id=producto.categoria_id,
+                    precio__gte=precio_min,
+                    precio__lte=precio_max,
+                ).order_by('precio', 'id')[:25],
+            ),
+            (
+                'Rango de precio, ordenado por precio',
+                activos.filter(precio__gte=precio_min, precio__lte=precio_max).order_by('precio', 'id')[:25],
+            ),
+            (
+                'Solo en stock (conteo)',
+                activos.filter(stock__gt=0).values('stock').annotate(total=Count('id')).order_by(),
+            ),
+            (
+                'Categoría + rango de precio (facetas)',
+                activos.filter(
+                    categoria_id=producto.categoria_id,
+                    precio__gte=precio_min,
+                    precio__lte=precio_max,
+                ).order_by().values('categoria_id', 'marca_id', 'material_id').annotate(total=Count('id')),
+            ),
+        ]
+
+        self.stdout.write(f'{activos.count()} productos activos, {repeticiones} repeticiones por consulta\n')
+        for nombre, queryset in consultas:
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                list(queryset.all())
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+
+            plan = self._plan(queryset)
+            usa_indice = not any(
+                linea.startswith('SCAN app_luzzen_producto') and 'INDEX' not in linea
+                for linea in plan
+            )
+            estilo = self.style.SUCCESS if usa_indice else self.style.ERROR
+            self.stdout.write(estilo(f'{nombre}: mediana {statistics.median(tiempos):.2f} ms'))
+            for linea in plan:
+                self.stdout.write(f'    {linea}')
+
+    def _plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                return [fila[-1] for fila in cursor.fetchall()]
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return [' '.join(str(valor) for valor in fila) for fila in cursor.fetchall()]
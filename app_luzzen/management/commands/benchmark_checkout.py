@@ -0,0 +1,153 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from app_luzzen import checkout, stock_fraccionado
+from app_luzzen.models import Categoria, ItemPedido, Marca, Material, Pedido, Producto, Usuario
+
+# Caché del propio proceso: los ids de la base temporal no deben pisar los de la tienda
+CACHE_LOCAL = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+    for alias in ('default', 'versiones', 'sesiones')
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide las compras por segundo de un mismo producto con muchos hilos, con el '
+        'stock en una sola fila y repartido en --fracciones filas, y comprueba que no '
+        'se venda más de lo disponible. Trabaja sobre una base de datos temporal '
+        '(con las migraciones aplicadas) que se borra al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=16)
+        parser.add_argument('--pedidos', type=int, default=400)
+        parser.add_argument('--stock', type=int, default=300)
+        parser.add_argument('--cantidad', type=int, default=1, help='Unidades por pedido')
+        parser.add_argument('--fracciones', type=int, default=stock_fraccionado.FRACCIONES)
+
+    def handle(self, *args, **options):
+        if options['fracciones'] < 2:
+            raise CommandError('--fracciones debe ser al menos 2')
+
+        nombre_original = connection.settings_dict['NAME']
+        prueba_original = connection.settings_dict.get('TEST', {})
+        connection.settings_dict['TEST'] = {
+            **prueba_original,
+            'NAME': os.path.join(tempfile.gettempdir(), f'luzzen_benchmark_{os.getpid()}.sqlite3'),
+        }
+        with override_settings(CACHES=CACHE_LOCAL):
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self.categoria = Categoria.objects.create(nombre='Benchmark')
+                self.marca = Marca.objects.create(nombre='Benchmark')
+                self.material = Material.objects.create(nombre='Benchmark', precio=0)
+                rendimiento = {}
+                for fracciones in (1, options['fracciones']):
+                    self.stdout.write(self.style.MIGRATE_HEADING(
+                        f'Stock en {fracciones} fracciones' if fracciones > 1 else 'Stock en una sola fila'
+                    ))
+                    rendimiento[fracciones] = self._ejecutar(fracciones, options)
+            finally:
+                connection.creation.destroy_test_db(nombre_original, verbosity=0)
+                connection.settings_dict['TEST'] = prueba_original
+
+        fraccionado = rendimiento[options['fracciones']]
+        self.stdout.write(
+            f'Pedidos por segundo: {rendimiento[1]:.0f} en una fila, {fraccionado:.0f} en '
+            f"{options['fracciones']} fracciones (x{fraccionado / rendimiento[1]:.2f})"
+        )
+
+    def _ejecutar(self, fracciones, options):
+        producto = Producto.objects.create(
+            nombre=f'Benchmark {fracciones}', descripcion='-', precio=1, stock=options['stock'],
+            categoria=self.categoria, marca=self.marca, material=self.material,
+        )
+        if fracciones > 1:
+            stock_fraccionado.repartir(producto, fracciones)
+        Usuario.objects.bulk_create([
+            Usuario(nombre='-', email=f'{fracciones}-{i}@luzzen.local', contraseña='-', pais='-', direccion='-')
+            for i in range(options['pedidos'])
+        ])
+        pedidos = [
+            Pedido.objects.create(cliente=usuario)
+            for usuario in Usuario.objects.filter(email__startswith=f'{fracciones}-')
+        ]
+        ItemPedido.objects.bulk_create([
+            ItemPedido(pedido=pedido, producto=producto, cantidad=options['cantidad'], precio_unitario=1)
+            for pedido in pedidos
+        ])
+
+        self._lanzar(pedidos, options['hilos'])
+        self._comprobar(producto, options)
+        return options['pedidos'] / self.duracion
+
+    def _lanzar(self, pedidos, hilos):
+        pendientes = list(pedidos)
+        bloqueo = threading.Lock()
+        self.resultados = {'completados': 0, 'sin_stock': 0, 'errores': []}
+        self.tiempos = []
+
+        def trabajar():
+            try:
+                while True:
+                    with bloqueo:
+                        if not pendientes:
+                            return
+                        pedido = pendientes.pop()
+                    inicio = time.perf_counter()
+                    try:
+                        checkout.completar_pedido(pedido)
+                        clave = 'completados'
+                    except checkout.StockInsuficiente:
+                        clave = 'sin_stock'
+                    except Exception as e:
+                        with bloqueo:
+                            self.resultados['errores'].append(repr(e))
+                        continue
+                    with bloqueo:
+                        self.resultados[clave] += 1
+                        self.tiempos.append((time.perf_counter() - inicio) * 1000)
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        grupo = [threading.Thread(target=trabajar) for _ in range(hilos)]
+        for hilo in grupo:
+            hilo.start()
+        for hilo in grupo:
+            hilo.join()
+        self.duracion = time.perf_counter() - inicio
+
+    def _comprobar(self, producto, options):
+        stock_fraccionado.sincronizar([producto.id])
+        producto.refresh_from_db()
+        esperados = min(options['pedidos'], options['stock'] // options['cantidad'])
+        completados = self.resultados['completados']
+        vendidos = completados * options['cantidad']
+
+        self.stdout.write(
+            f"{options['pedidos']} pedidos con {options['hilos']} hilos en {self.duracion:.2f} s: "
+            f"{completados} completados, {self.resultados['sin_stock']} sin stock, "
+            f"{len(self.resultados['errores'])} errores"
+        )
+        if self.tiempos:
+            self.stdout.write(
+                f'Latencia por compra: mediana {statistics.median(self.tiempos):.1f} ms, '
+                f'máxima {max(self.tiempos):.1f} ms'
+            )
+        for error in self.resultados['errores'][:5]:
+            self.stderr.write(error)
+
+        if completados != esperados or producto.stock != options['stock'] - vendidos or producto.stock < 0:
+            raise CommandError(
+                f'Inconsistencia: stock final {producto.stock}, vendidos {producto.vendidos} '
+                f'(esperados {esperados} pedidos)'
+            )
@@ -0,0 +1,100 @@
+import os
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app_luzzen import cola_imagenes, imagenes
+from app_luzzen.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Renombra las imágenes de producto por contenido, unifica duplicados y borra las huérfanas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Muestra los cambios sin aplicarlos')
+        parser.add_argument(
+            '--antiguedad-minima', type=int, default=3600,
+            help='Segundos que debe tener un archivo sin referencias para borrarlo (subidas en curso)',
+        )
+
+    def handle(self, *args, **options):
+        campo = Producto._meta.get_field('imagen')
+        self.almacenamiento = campo.storage
+        self.simular = options['simular']
+        carpeta = campo.upload_to.strip('/')
+
+        self._unificar()
+        limite = timezone.now() - timedelta(seconds=options['antiguedad_minima'])
+        self._recolectar(carpeta, limite)
+
+    def _unificar(self):
+        nombres = (
+            Producto.objects.exclude(imagen='')
+            .order_by('imagen')
+            .values_list('imagen', flat=True)
+            .distinct()
+        )
+        for nombre in list(nombres):
+            if not self.almacenamiento.exists(nombre):
+                self.stderr.write(f'{nombre}: no existe')
+                continue
+            with self.almacenamiento.open(nombre, 'rb') as archivo:
+                destino = self.almacenamiento.nombre_por_contenido(nombre, archivo)
+                if destino == nombre:
+                    continue
+                if not self.simular and not self.almacenamiento.exists(destino):
+                    destino = self.almacenamiento.save(nombre, archivo)
+
+            self.stdout.write(f'{nombre} -> {destino}')
+            if self.simular:
+                continue
+            # update() no dispara señales: la imagen no forma parte de los índices
+            Producto.objects.filter(imagen=nombre).update(imagen=destino)
+            if not imagenes.tiene_derivadas(destino):
+                cola_imagenes.encolar(Producto.objects.filter(imagen=destino).first())
+
+    def _recolectar(self, carpeta, limite):
+        referenciadas = set(Producto.objects.values_list('imagen', flat=True))
+        bases = {os.path.splitext(os.path.basename(nombre))[0] for nombre in referenciadas}
+        liberado = 0
+        borrados = 0
+
+        # Originales sin producto
+        _, archivos = self.almacenamiento.listdir(carpeta)
+        for archivo in archivos:
+            ruta = f'{carpeta}/{archivo}'
+            if ruta not in referenciadas:
+                tamano = self._borrar(self.almacenamiento, ruta, limite)
+                if tamano is not None:
+                    liberado += tamano
+                    borrados += 1
+
+        # Derivadas de originales que ya no existen
+        carpeta_derivadas = f'{carpeta}/{imagenes.CARPETA_DERIVADAS}'
+        if default_storage.exists(carpeta_derivadas):
+            _, archivos = default_storage.listdir(carpeta_derivadas)
+            for archivo in archivos:
+                base = os.path.splitext(archivo)[0].rsplit('_', 1)[0]
+                ruta = f'{carpeta_derivadas}/{archivo}'
+                if base not in bases:
+                    tamano = self._borrar(default_storage, ruta, limite)
+                    if tamano is not None:
+                        liberado += tamano
+                        borrados += 1
+
+        accion = 'se borrarían' if self.simular else 'borrados'
+        self.stdout.write(self.style.SUCCESS(
+            f'{borrados} archivos huérfanos {accion} ({liberado / 1024 / 1024:.1f} MB)'
+        ))
+
+    def _borrar(self, almacenamiento, ruta, limite):
+        """Borra el archivo si es lo bastante antiguo; devuelve los bytes liberados o None"""
+        if almacenamiento.get_modified_time(ruta) > limite:
+            return None
+        tamano = almacenamiento.size(ruta)
+        self.stdout.write(f'huérfano: {ruta}')
+        if not self.simular:
+            almacenamiento.delete(ruta)
+        return tamano
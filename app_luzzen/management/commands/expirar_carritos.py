@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app_luzzen import carrito
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra por lotes los carritos (pedidos pendientes) sin actividad desde hace más '
+        'de --dias. Cada lote es una transacción corta; si se interrumpe basta con '
+        'volver a lanzarlo (o seguir desde el último id con --desde-id).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=carrito.DIAS_ABANDONO)
+        parser.add_argument('--lote', type=int, default=500, help='Carritos por transacción')
+        parser.add_argument('--pausa', type=float, default=0.0, help='Segundos entre lotes, para no acaparar la base de datos')
+        parser.add_argument('--desde-id', type=int, default=0)
+        parser.add_argument('--simular', action='store_true', help='Solo cuenta los carritos que se borrarían')
+
+    def handle(self, *args, **options):
+        carritos = carrito.abandonados(options['dias'])
+        if options['simular']:
+            self.stdout.write(f"{carritos.filter(id__gt=options['desde_id']).count()} carritos se borrarían")
+            return
+
+        ultimo_id, total = options['desde_id'], 0
+        while True:
+            ultimo_id_lote, borrados = carrito.expirar_lote(carritos, options['lote'], ultimo_id)
+            if ultimo_id_lote is None:
+                break
+            ultimo_id = ultimo_id_lote
+            total += borrados
+            self.stdout.write(f'{borrados} carritos borrados (hasta id {ultimo_id})')
+            if options['pausa']:
+                time.sleep(options['pausa'])
+        self.stdout.write(self.style.SUCCESS(f'{total} carritos abandonados borrados'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from app_luzzen import cache_catalogo, imagenes
+from app_luzzen.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Genera las variantes WebP/JPEG de las imágenes de producto que aún no las tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forzar', action='store_true', help='Regenera también las que ya existen')
+
+    def handle(self, *args, **options):
+        nombres = (
+            Producto.objects.exclude(imagen='')
+            .order_by('imagen')
+            .values_list('imagen', flat=True)
+            .distinct()
+        )
+        generadas = 0
+        for nombre in nombres.iterator():
+            if not options['forzar'] and imagenes.tiene_derivadas(nombre):
+                continue
+            try:
+                imagenes.generar_derivadas(nombre)
+            except (OSError, ValueError) as e:
+                self.stderr.write(f'{nombre}: {e}')
+                continue
+            generadas += 1
+            self.stdout.write(f'{nombre}')
+
+        if generadas:
+            cache_catalogo.invalidar()
+        self.stdout.write(self.style.SUCCESS(f'{generadas} imágenes procesadas'))
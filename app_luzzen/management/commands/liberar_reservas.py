@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app_luzzen import reservas
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra las reservas de stock caducadas por lotes. Se puede dejar en marcha '
+        'o lanzar periódicamente (cron) con --una-vez.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Reservas borradas por consulta')
+        parser.add_argument('--intervalo', type=float, default=60.0, help='Segundos entre barridos')
+        parser.add_argument('--una-vez', action='store_true', help='Hace un solo barrido y termina')
+
+    def handle(self, *args, **options):
+        while True:
+            borradas = reservas.barrer(options['lote'])
+            if borradas or options['una_vez']:
+                self.stdout.write(f'{borradas} reservas caducadas borradas')
+            if options['una_vez']:
+                return
+            time.sleep(options['intervalo'])
@@ -0,0 +1,79 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+
+
+def _inicializar_proceso():
+    # Con el arranque 'spawn' (Windows, macOS) el proceso hijo empieza sin Django configurado
+    import django
+    django.setup()
+
+
+def _procesar(nombre):
+    # Se ejecuta en los procesos del grupo: solo trabaja con archivos, no con la base de datos
+    from app_luzzen import imagenes
+    imagenes.generar_derivadas(nombre)
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de imágenes de producto con un grupo de procesos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos entre consultas a la cola vacía')
+        parser.add_argument('--una-vez', action='store_true', help='Termina cuando la cola queda vacía')
+
+    def handle(self, *args, **options):
+        # Los modelos se importan aquí: este módulo también se importa en los
+        # procesos hijos antes de que Django esté configurado
+        from app_luzzen import cache_catalogo, cola_imagenes
+
+        procesos = options['procesos']
+        recuperadas = cola_imagenes.recuperar_abandonadas()
+        if recuperadas:
+            self.stdout.write(f'{recuperadas} tareas abandonadas devueltas a la cola')
+
+        while True:
+            with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso) as grupo:
+                try:
+                    while True:
+                        tareas = cola_imagenes.reclamar(procesos * 2)
+                        if not tareas:
+                            if options['una_vez']:
+                                return
+                            time.sleep(options['intervalo'])
+                            continue
+                        self._procesar_lote(grupo, tareas, cola_imagenes)
+                        cache_catalogo.invalidar()
+                except BrokenProcessPool:
+                    # Un proceso hijo murió (p. ej. sin memoria): se crea un grupo nuevo
+                    self.stderr.write('El grupo de procesos se detuvo, reiniciando')
+
+    def _procesar_lote(self, grupo, tareas, cola_imagenes):
+        futuros = {}
+        for tarea in tareas:
+            if tarea.imagen != tarea.producto.imagen.name:
+                # La imagen se reemplazó después de encolar: ya hay otra tarea para la nueva
+                cola_imagenes.completar(tarea)
+                continue
+            futuros[grupo.submit(_procesar, tarea.imagen)] = tarea
+
+        grupo_roto = None
+        for futuro in as_completed(futuros):
+            tarea = futuros[futuro]
+            try:
+                futuro.result()
+            except BrokenProcessPool as e:
+                cola_imagenes.registrar_fallo(tarea, str(e) or 'El proceso terminó inesperadamente')
+                grupo_roto = e
+            except Exception as e:
+                cola_imagenes.registrar_fallo(tarea, str(e))
+                self.stderr.write(f'{tarea.imagen}: {e}')
+            else:
+                cola_imagenes.completar(tarea)
+                self.stdout.write(f'{tarea.imagen}')
+        if grupo_roto:
+            raise grupo_roto
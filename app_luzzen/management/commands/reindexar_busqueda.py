@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from app_luzzen import busqueda
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de texto completo del catálogo de productos'
+
+    def handle(self, *args, **options):
+        trigramas = busqueda.reconstruir_trigramas()
+        self.stdout.write(self.style.SUCCESS(f'Índice de trigramas reconstruido: {trigramas} trigramas'))
+
+        if not busqueda.disponible():
+            self.stdout.write(self.style.WARNING(
+                'La base de datos no soporta FTS5; el catálogo usa búsqueda simple'
+            ))
+            return
+
+        total = busqueda.reconstruir_indice()
+        self.stdout.write(self.style.SUCCESS(f'Índice reconstruido: {total} productos indexados'))
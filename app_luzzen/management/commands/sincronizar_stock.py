@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app_luzzen import cache_catalogo, stock_fraccionado
+from app_luzzen.models import Producto
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia en cada producto con stock fraccionado la suma de sus fracciones '
+        '(lo que muestran el catálogo y los filtros). También fracciona o unifica productos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fraccionar', type=int, nargs='+', default=[], metavar='ID', help='Productos a fraccionar')
+        parser.add_argument('--unificar', type=int, nargs='+', default=[], metavar='ID', help='Productos a volver a una sola fila')
+        parser.add_argument('--fracciones', type=int, default=stock_fraccionado.FRACCIONES)
+        parser.add_argument('--intervalo', type=float, default=10.0, help='Segundos entre sincronizaciones')
+        parser.add_argument('--una-vez', action='store_true', help='Sincroniza una vez y termina')
+
+    def handle(self, *args, **options):
+        for producto in Producto.objects.filter(id__in=options['fraccionar']):
+            stock_fraccionado.repartir(producto, options['fracciones'])
+            self.stdout.write(f'{producto}: stock repartido en {options["fracciones"]} fracciones')
+        for producto in Producto.objects.filter(id__in=options['unificar'], stock_fraccionado=True):
+            stock_fraccionado.unificar(producto)
+            self.stdout.write(f'{producto}: stock unificado ({producto.stock})')
+
+        while True:
+            cambiados = stock_fraccionado.sincronizar()
+            if cambiados:
+                agotados = Producto.objects.filter(id__in=cambiados, stock__lte=0).exists()
+                cache_catalogo.invalidar_productos(cambiados, agotados)
+            if cambiados or options['una_vez']:
+                self.stdout.write(f'{len(cambiados)} productos sincronizados')
+            if options['una_vez']:
+                return
+            time.sleep(options['intervalo'])
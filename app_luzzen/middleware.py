@@ -0,0 +1,65 @@
+from django.core.cache import cache
+from django.http import Http404
+from django.utils.functional import SimpleLazyObject
+
+from .models import Usuario
+
+# Columnas que necesitan las vistas; la contraseña solo se lee al iniciar sesión
+CAMPOS_USUARIO = ('id', 'nombre', 'email', 'pais', 'direccion')
+
+# Segundos que se reutiliza el usuario entre peticiones
+DURACION_USUARIO = 300
+
+
+def _clave(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+def invalidar_usuario(usuario_id):
+    cache.delete(_clave(usuario_id))
+
+
+def cargar_usuario(usuario_id):
+    """Usuario con las columnas de CAMPOS_USUARIO; None si no existe.
+
+    Se guarda en la caché compartida por todos los procesos, y las señales
+    de Usuario lo borran al guardarlo o borrarlo: un usuario borrado deja de
+    estar autenticado en la petición siguiente, en cualquier proceso.
+    """
+    if not usuario_id:
+        return None
+    usuario = cache.get(_clave(usuario_id))
+    if usuario is None:
+        usuario = Usuario.objects.only(*CAMPOS_USUARIO).filter(id=usuario_id).first()
+        if usuario is not None:
+            cache.set(_clave(usuario_id), usuario, DURACION_USUARIO)
+    return usuario
+
+
+def usuario_actual(request):
+    """Usuario de la sesión, cargado como mucho una vez por petición"""
+    if not hasattr(request, '_usuario_actual'):
+        request._usuario_actual = cargar_usuario(request.session.get('usuario_id'))
+    return request._usuario_actual
+
+
+def usuario_o_404(request):
+    usuario = usuario_actual(request)
+    if usuario is None:
+        raise Http404('Usuario no encontrado')
+    return usuario
+
+
+class UsuarioActualMiddleware:
+    """Expone el usuario de la sesión como `request.usuario`.
+
+    Es perezoso: las peticiones que no lo usan (catálogo, estáticos) no lo
+    cargan, y las que sí lo leen de la caché o con una sola consulta.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.usuario = SimpleLazyObject(lambda: usuario_actual(request))
+        return self.get_response(request)
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def crear_indice(apps, schema_editor):
+    # FTS5 solo existe en SQLite; en otros motores el catálogo usa búsqueda simple
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS app_luzzen_producto_fts USING fts5(
+            nombre, descripcion, categoria, marca, material,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    schema_editor.execute("""
+        INSERT INTO app_luzzen_producto_fts (rowid, nombre, descripcion, categoria, marca, material)
+        SELECT p.id, p.nombre, p.descripcion, c.nombre, m.nombre, t.nombre
+        FROM app_luzzen_producto p
+        JOIN app_luzzen_categoria c ON c.id = p.categoria_id
+        JOIN app_luzzen_marca m ON m.id = p.marca_id
+        JOIN app_luzzen_material t ON t.id = p.material_id
+    """)
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS app_luzzen_producto_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_luzzen', '0002_remove_usuario_saldo'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
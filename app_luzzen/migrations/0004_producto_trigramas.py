@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from app_luzzen.texto import normalizar, trigramas
+
+
+def poblar_trigramas(apps, schema_editor):
+    Producto = apps.get_model('app_luzzen', 'Producto')
+    ProductoTrigrama = apps.get_model('app_luzzen', 'ProductoTrigrama')
+    filas = []
+    for producto in Producto.objects.all():
+        producto.nombre_normalizado = normalizar(producto.nombre)
+        producto.save(update_fields=['nombre_normalizado'])
+        filas.extend(
+            ProductoTrigrama(producto_id=producto.id, trigrama=trigrama)
+            for trigrama in trigramas(producto.nombre_normalizado)
+        )
+    ProductoTrigrama.objects.bulk_create(filas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_luzzen', '0003_producto_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='nombre_normalizado',
+            field=models.CharField(default='', editable=False, max_length=200),
+        ),
+        migrations.CreateModel(
+            name='ProductoTrigrama',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigrama', models.CharField(max_length=3)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigramas', to='app_luzzen.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigrama', 'producto'], name='trigrama_producto_idx')],
+                'unique_together': {('producto', 'trigrama')},
+            },
+        ),
+        migrations.RunPython(poblar_trigramas, migrations.RunPython.noop),
+    ]
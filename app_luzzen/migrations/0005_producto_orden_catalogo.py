@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:03
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def calcular_vendidos(apps, schema_editor):
+    Producto = apps.get_model('app_luzzen', 'Producto')
+    ItemPedido = apps.get_model('app_luzzen', 'ItemPedido')
+    vendidos = (
+        ItemPedido.objects.filter(producto=OuterRef('pk'), pedido__estado='completado')
+        .values('producto')
+        .annotate(total=Sum('cantidad'))
+        .values('total')
+    )
+    Producto.objects.update(vendidos=Coalesce(Subquery(vendidos), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_luzzen', '0004_producto_trigramas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='fecha_creacion',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='vendidos',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(calcular_vendidos, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'precio', 'id'], name='producto_orden_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'nombre_normalizado', 'id'], name='producto_orden_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'fecha_creacion', 'id'], name='producto_orden_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'vendidos', 'id'], name='producto_orden_vendidos_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:18
+
+import app_luzzen.almacenamiento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_luzzen', '0007_tareaimagen'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='producto',
+            name='imagen',
+            field=models.ImageField(storage=app_luzzen.almacenamiento.AlmacenamientoPorContenido(), upload_to='productos/'),
+        ),
+    ]
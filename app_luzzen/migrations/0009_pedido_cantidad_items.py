@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:22
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def calcular_cantidades(apps, schema_editor):
+    Pedido = apps.get_model('app_luzzen', 'Pedido')
+    ItemPedido = apps.get_model('app_luzzen', 'ItemPedido')
+    items = ItemPedido.objects.filter(pedido=OuterRef('pk')).order_by().values('pedido')
+    Pedido.objects.update(
+        cantidad_items=Coalesce(Subquery(items.annotate(n=Count('id')).values('n')), 0)
+    )
+    # El total de los carritos abiertos podía haber quedado mal (al eliminar
+    # un artículo no se recalculaba); los pedidos cerrados no se tocan
+    importe = items.annotate(
+        importe=Sum(F('cantidad') * F('precio_unitario'), output_field=DecimalField(max_digits=10, decimal_places=2))
+    ).values('importe')
+    Pedido.objects.filter(estado='pendiente').update(total=Coalesce(Subquery(importe), 0, output_field=DecimalField(max_digits=10, decimal_places=2)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_luzzen', '0008_producto_imagen_por_contenido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='cantidad_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(calcular_cantidades, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_luzzen', '0009_pedido_cantidad_items'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reserva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('expira', models.DateTimeField()),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='app_luzzen.pedido')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='app_luzzen.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', 'expira'], name='reserva_producto_expira_idx'), models.Index(fields=['expira'], name='reserva_expira_idx')],
+                'constraints': [models.UniqueConstraint(fields=('pedido', 'producto'), name='reserva_pedido_producto_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_luzzen', '0010_reserva'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='stock_fraccionado',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='FraccionStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('indice', models.PositiveSmallIntegerField()),
+                ('stock', models.PositiveIntegerField(default=0)),
+                ('vendidos', models.PositiveIntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fracciones_stock', to='app_luzzen.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('producto', 'indice'), name='fraccion_stock_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_luzzen', '0011_stock_fraccionado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolicitudPago',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64, unique=True)),
+                ('resultado', models.CharField(choices=[('completado', 'Completado'), ('rechazado', 'Rechazado')], max_length=20)),
+                ('mensaje', models.CharField(blank=True, max_length=255)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_luzzen.usuario')),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app_luzzen.pedido')),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:31
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copiar_fecha_creacion(apps, schema_editor):
+    # Sin historial de cambios, la mejor aproximación es la fecha de creación
+    Pedido = apps.get_model('app_luzzen', 'Pedido')
+    Pedido.objects.update(ultima_actividad=F('fecha_creacion'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_luzzen', '0012_solicitudpago'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='ultima_actividad',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copiar_fecha_creacion, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['estado', 'ultima_actividad'], name='pedido_estado_actividad_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:32
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def unificar_carritos(apps, schema_editor):
+    # Antes de crear la restricción: el cliente con varios carritos abiertos se
+    # queda con el más antiguo, que recibe los artículos de los demás
+    Pedido = apps.get_model('app_luzzen', 'Pedido')
+    ItemPedido = apps.get_model('app_luzzen', 'ItemPedido')
+    Reserva = apps.get_model('app_luzzen', 'Reserva')
+
+    duplicados = (
+        Pedido.objects.filter(estado='pendiente')
+        .values('cliente')
+        .annotate(carritos=Count('id'))
+        .filter(carritos__gt=1)
+        .values_list('cliente', flat=True)
+    )
+    for cliente_id in list(duplicados):
+        carritos = list(Pedido.objects.filter(cliente_id=cliente_id, estado='pendiente').order_by('id'))
+        destino, sobrantes = carritos[0], carritos[1:]
+
+        items = {item.producto_id: item for item in ItemPedido.objects.filter(pedido=destino)}
+        for item in ItemPedido.objects.filter(pedido__in=sobrantes).order_by('id'):
+            existente = items.get(item.producto_id)
+            if existente:
+                existente.cantidad += item.cantidad
+                existente.save(update_fields=['cantidad'])
+                item.delete()
+            else:
+                item.pedido = destino
+                item.save(update_fields=['pedido'])
+                items[item.producto_id] = item
+
+        # Las reservas se rehacen con el siguiente cambio del carrito
+        Reserva.objects.filter(pedido__in=sobrantes).delete()
+        destino.total = sum(item.cantidad * item.precio_unitario for item in items.values())
+        destino.cantidad_items = len(items)
+        destino.ultima_actividad = max(carrito.ultima_actividad for carrito in carritos)
+        destino.save(update_fields=['total', 'cantidad_items', 'ultima_actividad'])
+        Pedido.objects.filter(id__in=[carrito.id for carrito in sobrantes]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_luzzen', '0013_pedido_ultima_actividad'),
+    ]
+
+    operations = [
+        migrations.RunPython(unificar_carritos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='pedido',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'pendiente')), fields=('cliente',), name='pedido_carrito_unico'),
+        ),
+    ]
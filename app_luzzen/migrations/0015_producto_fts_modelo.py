@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_luzzen', '0014_pedido_carrito_unico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoFTS',
+            fields=[
+                ('producto', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='fts', serialize=False, to='app_luzzen.producto')),
+                ('documento', models.TextField(db_column='app_luzzen_producto_fts')),
+            ],
+            options={
+                'db_table': 'app_luzzen_producto_fts',
+                'managed': False,
+            },
+        ),
+    ]
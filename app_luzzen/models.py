@@ -1,4 +1,8 @@
 from django.db import models
+from django.utils import timezone
+
+from .almacenamiento import AlmacenamientoPorContenido
+from .texto import normalizar
 
 # App productos
 class Categoria(models.Model):
@@ -29,15 +33,128 @@ class Producto(models.Model):
     descripcion = models.TextField()
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
-    imagen = models.ImageField(upload_to='productos/')
+    imagen = models.ImageField(upload_to='productos/', storage=AlmacenamientoPorContenido())
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
     marca = models.ForeignKey(Marca, on_delete=models.CASCADE)
     material = models.ForeignKey(Material, on_delete=models.CASCADE)
     activo = models.BooleanField(default=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    vendidos = models.IntegerField(default=0)  # Unidades vendidas, para ordenar por popularidad
+    # Copia del nombre sin acentos ni mayúsculas para la búsqueda tolerante
+    nombre_normalizado = models.CharField(max_length=200, default='', editable=False)
+    # Stock repartido en FraccionStock; stock y vendidos son entonces una copia
+    # que se sincroniza periódicamente
+    stock_fraccionado = models.BooleanField(default=False)
+    
+    class Meta:
+        # Índices para la paginación por cursor de cada orden del catálogo
+        indexes = [
+            models.Index(fields=['activo', 'precio', 'id'], name='producto_orden_precio_idx'),
+            models.Index(fields=['activo', 'nombre_normalizado', 'id'], name='producto_orden_nombre_idx'),
+            models.Index(fields=['activo', 'fecha_creacion', 'id'], name='producto_orden_fecha_idx'),
+            models.Index(fields=['activo', 'vendidos', 'id'], name='producto_orden_vendidos_idx'),
+            # Filtros de rango de precio por categoría y de disponibilidad
+            models.Index(fields=['activo', 'categoria', 'precio'], name='producto_cat_precio_idx'),
+            models.Index(fields=['activo', 'stock'], name='producto_stock_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.nombre_normalizado = normalizar(self.nombre)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nombre' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'nombre_normalizado'}
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return self.nombre
 
+class FraccionStock(models.Model):
+    """Parte del stock de un producto muy vendido.
+
+    Cada compra descuenta de una fracción al azar, así las compras simultáneas
+    del mismo producto no esperan todas a la misma fila.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='fracciones_stock')
+    indice = models.PositiveSmallIntegerField()
+    stock = models.PositiveIntegerField(default=0)
+    vendidos = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'indice'], name='fraccion_stock_unica'),
+        ]
+    
+    def __str__(self):
+        return f"{self.producto_id}/{self.indice}: {self.stock}"
+
+class Coincide(models.Lookup):
+    """`campo__coincide=consulta` genera `campo MATCH consulta` (FTS5)"""
+    lookup_name = 'coincide'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+class ProductoFTS(models.Model):
+    """Tabla virtual FTS5 del buscador, creada por la migración 0003 (solo SQLite).
+
+    El ORM no la gestiona: sirve para unirla a Producto en las consultas. El
+    rowid es el id del producto y la columna oculta con el nombre de la tabla
+    es la que recibe el MATCH y la que se pasa a bm25().
+    """
+    producto = models.OneToOneField(
+        Producto, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        db_constraint=False, related_name='fts',
+    )
+    documento = models.TextField(db_column='app_luzzen_producto_fts')
+    
+    class Meta:
+        managed = False
+        db_table = 'app_luzzen_producto_fts'
+
+ProductoFTS._meta.get_field('documento').register_lookup(Coincide)
+
+class ProductoTrigrama(models.Model):
+    """Índice invertido de trigramas del nombre normalizado"""
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='trigramas')
+    trigrama = models.CharField(max_length=3)
+    
+    class Meta:
+        unique_together = ['producto', 'trigrama']
+        indexes = [
+            models.Index(fields=['trigrama', 'producto'], name='trigrama_producto_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.trigrama} - {self.producto_id}"
+
+class TareaImagen(models.Model):
+    """Cola de procesamiento de imágenes de producto (variantes redimensionadas)"""
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+    
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='tareas_imagen')
+    imagen = models.CharField(max_length=255)  # Nombre del archivo a procesar
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    disponible_desde = models.DateTimeField(default=timezone.now)  # Espera entre reintentos
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde'], name='tarea_imagen_cola_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.imagen} - {self.estado}"
+
 # App usuarios
 class Usuario(models.Model):
     nombre = models.CharField(max_length=100)
@@ -61,6 +178,20 @@ class Pedido(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    cantidad_items = models.PositiveIntegerField(default=0)  # Líneas del pedido, se mantiene con cada cambio
+    ultima_actividad = models.DateTimeField(default=timezone.now)  # Último cambio del carrito
+    
+    class Meta:
+        constraints = [
+            # Un solo carrito abierto por cliente (índice único parcial)
+            models.UniqueConstraint(
+                fields=['cliente'], condition=models.Q(estado='pendiente'), name='pedido_carrito_unico',
+            ),
+        ]
+        indexes = [
+            # Carritos abandonados (expirar_carritos) y recuento de pendientes
+            models.Index(fields=['estado', 'ultima_actividad'], name='pedido_estado_actividad_idx'),
+        ]
     
     def __str__(self):
         return f"Pedido {self.id} - {self.cliente.nombre}"
@@ -74,6 +205,48 @@ class ItemPedido(models.Model):
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre}"
 
+class SolicitudPago(models.Model):
+    """Resultado de un envío del formulario de pago, identificado por su clave.
+
+    La clave se genera al mostrar el formulario: si el mismo envío llega dos
+    veces (doble clic, reintento del navegador) se responde con este resultado.
+    """
+    RESULTADO_CHOICES = [
+        ('completado', 'Completado'),
+        ('rechazado', 'Rechazado'),
+    ]
+    
+    clave = models.CharField(max_length=64, unique=True)
+    cliente = models.ForeignKey(Usuario, on_delete=models.CASCADE)
+    pedido = models.ForeignKey(Pedido, on_delete=models.SET_NULL, null=True, blank=True)
+    resultado = models.CharField(max_length=20, choices=RESULTADO_CHOICES)
+    mensaje = models.CharField(max_length=255, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.clave} - {self.resultado}"
+
+class Reserva(models.Model):
+    """Unidades de un producto apartadas por un carrito hasta `expira`"""
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='reservas')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    expira = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['pedido', 'producto'], name='reserva_pedido_producto_unica'),
+        ]
+        indexes = [
+            # Unidades reservadas de un producto: SUM(cantidad) WHERE producto_id = ? AND expira > ahora
+            models.Index(fields=['producto', 'expira'], name='reserva_producto_expira_idx'),
+            # Barrido de reservas caducadas
+            models.Index(fields=['expira'], name='reserva_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id} (pedido {self.pedido_id})"
+
 # App favoritos
 class Favorito(models.Model):
     cliente = models.ForeignKey(Usuario, on_delete=models.CASCADE)
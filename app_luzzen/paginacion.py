@@ -0,0 +1,84 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+# Órdenes del catálogo: clave del parámetro GET -> (campo, descendente, etiqueta)
+ORDENES = {
+    'relevancia': ('relevancia', False, 'Relevancia'),
+    'recientes': ('fecha_creacion', True, 'Más recientes'),
+    'populares': ('vendidos', True, 'Más vendidos'),
+    'precio': ('precio', False, 'Precio: menor a mayor'),
+    '-precio': ('precio', True, 'Precio: mayor a menor'),
+    'nombre': ('nombre_normalizado', False, 'Nombre'),
+}
+
+TAMANO_PAGINA = 24
+
+
+def _serializar(valor):
+    # Fechas con microsegundos completos: el cursor debe reproducir el valor exacto
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f'No se puede serializar {type(valor).__name__} en un cursor')
+
+
+def codificar_cursor(valor, ultimo_id):
+    datos = json.dumps([valor, ultimo_id], default=_serializar)
+    return base64.urlsafe_b64encode(datos.encode()).decode()
+
+
+def decodificar_cursor(cursor, queryset, campo):
+    """Devuelve (valor, ultimo_id) o None si el cursor no es válido"""
+    try:
+        valor, ultimo_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        try:
+            valor = queryset.model._meta.get_field(campo).to_python(valor)
+        except FieldDoesNotExist:
+            # Anotaciones como la relevancia de la búsqueda
+            valor = float(valor)
+        return valor, int(ultimo_id)
+    except (ValueError, TypeError, binascii.Error, ValidationError):
+        return None
+
+
+def _valor(elemento, campo):
+    return elemento[campo] if isinstance(elemento, dict) else getattr(elemento, campo)
+
+
+def paginar(queryset, orden, cursor=None, tamano=None):
+    """Pagina por cursor (keyset): cada página filtra a partir de la última fila vista.
+
+    El cursor guarda el valor del campo de orden y el id de la última fila, así
+    que la página N se resuelve con un recorrido de índice igual que la primera.
+    Devuelve (elementos, cursor_siguiente).
+    """
+    tamano = tamano or TAMANO_PAGINA
+    campo, descendente, _ = ORDENES[orden]
+    if descendente:
+        queryset = queryset.order_by(f'-{campo}', '-id')
+    else:
+        queryset = queryset.order_by(campo, 'id')
+
+    posicion = decodificar_cursor(cursor, queryset, campo) if cursor else None
+    if posicion:
+        valor, ultimo_id = posicion
+        mayor, igual = ('lt', 'lte') if descendente else ('gt', 'gte')
+        # El primer filtro, redundante, permite al motor usar el índice como rango
+        queryset = queryset.filter(**{f'{campo}__{igual}': valor}).filter(
+            Q(**{f'{campo}__{mayor}': valor}) | Q(**{campo: valor, f'id__{mayor}': ultimo_id})
+        )
+
+    elementos = list(queryset[:tamano + 1])
+    siguiente = None
+    if len(elementos) > tamano:
+        elementos = elementos[:tamano]
+        ultimo = elementos[-1]
+        siguiente = codificar_cursor(_valor(ultimo, campo), _valor(ultimo, 'id'))
+    return elementos, siguiente
@@ -0,0 +1,105 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Producto, Reserva
+
+# Tiempo que un carrito aparta el stock desde su última modificación
+DURACION = timedelta(seconds=getattr(settings, 'RESERVA_DURACION', 15 * 60))
+
+
+def activas():
+    return Reserva.objects.filter(expira__gt=timezone.now())
+
+
+def reservado(producto='pk', excluir_pedido=None):
+    """Expresión con las unidades reservadas (sin caducar) del producto `producto` (OuterRef).
+
+    Usa el índice (producto, expira). Las reservas de `excluir_pedido` no
+    cuentan: un carrito no compite consigo mismo.
+    """
+    reservas = activas().filter(producto=OuterRef(producto)).order_by().values('producto')
+    if excluir_pedido is not None:
+        reservas = reservas.exclude(pedido=excluir_pedido)
+    return Coalesce(Subquery(reservas.annotate(unidades=Sum('cantidad')).values('unidades')), 0)
+
+
+def anotar_disponible(queryset, producto='pk', stock='stock', pedido=None):
+    """Añade `disponible` = stock - unidades reservadas por otros carritos"""
+    return queryset.annotate(disponible=F(stock) - reservado(producto, pedido))
+
+
+def reservado_por_producto(producto_ids, excluir_pedido=None):
+    """{producto_id: unidades reservadas sin caducar} de los productos que tienen alguna"""
+    reservas = activas().filter(producto_id__in=producto_ids)
+    if excluir_pedido is not None:
+        reservas = reservas.exclude(pedido=excluir_pedido)
+    return dict(reservas.order_by().values('producto').annotate(unidades=Sum('cantidad')).values_list('producto', 'unidades'))
+
+
+def disponibles(producto_ids, pedido=None):
+    """{producto_id: unidades disponibles} con una sola consulta"""
+    productos = anotar_disponible(Producto.objects.filter(id__in=producto_ids), pedido=pedido)
+    return dict(productos.values_list('id', 'disponible'))
+
+
+def reservar(pedido, cantidades):
+    """Ajusta las reservas del carrito a `cantidades` ({producto_id: cantidad}).
+
+    Devuelve los nombres de los productos que no tienen unidades suficientes;
+    en ese caso no se reserva nada. Bajar una cantidad o mantenerla nunca
+    falla. Cualquier cambio renueva la caducidad de todas las reservas del
+    carrito.
+    """
+    with transaction.atomic():
+        # Bloquea las filas de producto (en orden, sin interbloqueos) mientras se comprueba
+        productos = list(
+            Producto.objects.select_for_update().filter(id__in=cantidades).order_by('id').values_list('id', 'nombre')
+        )
+        libres = disponibles(cantidades, pedido)
+        propias = dict(activas().filter(pedido=pedido, producto_id__in=cantidades).values_list('producto_id', 'cantidad'))
+        faltan = [
+            nombre for producto_id, nombre in productos
+            if cantidades[producto_id] > libres[producto_id] and cantidades[producto_id] > propias.get(producto_id, 0)
+        ]
+        if faltan:
+            return faltan
+
+        expira = timezone.now() + DURACION
+        Reserva.objects.filter(
+            pedido=pedido, producto_id__in=[producto_id for producto_id, cantidad in cantidades.items() if not cantidad]
+        ).delete()
+        Reserva.objects.bulk_create(
+            [
+                Reserva(pedido=pedido, producto_id=producto_id, cantidad=cantidad, expira=expira)
+                for producto_id, cantidad in cantidades.items() if cantidad
+            ],
+            update_conflicts=True,
+            unique_fields=['pedido', 'producto'],
+            update_fields=['cantidad', 'expira'],
+        )
+        Reserva.objects.filter(pedido=pedido).update(expira=expira)
+    return []
+
+
+def liberar(pedido):
+    """Quita todas las reservas del carrito (compra completada o carrito abandonado)"""
+    return Reserva.objects.filter(pedido=pedido).delete()[0]
+
+
+def barrer(lote=1000):
+    """Borra las reservas caducadas en lotes de `lote` filas; devuelve cuántas.
+
+    No hace falta para que la disponibilidad sea correcta (las caducadas ya no
+    cuentan); solo evita que la tabla crezca.
+    """
+    borradas = 0
+    while True:
+        ids = list(Reserva.objects.filter(expira__lte=timezone.now()).values_list('id', flat=True)[:lote])
+        if not ids:
+            return borradas
+        borradas += Reserva.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,66 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import autocompletado, busqueda, cache_catalogo
+from .middleware import invalidar_usuario
+from .models import Categoria, Marca, Material, Producto, Usuario
+
+
+# Índice de búsqueda
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, **kwargs):
+    busqueda.indexar_producto(instance.id)
+    busqueda.indexar_trigramas(instance)
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, **kwargs):
+    busqueda.eliminar_producto(instance.id)
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=Marca)
+@receiver(post_save, sender=Material)
+def reindexar_relacionados(sender, instance, created, **kwargs):
+    # Los nombres de categoría, marca y material también se indexan
+    if not created:
+        busqueda.indexar_por_relacion(sender.__name__.lower(), instance.id)
+
+
+# Índice de autocompletado (en memoria, por proceso; avisa a los demás procesos)
+@receiver(post_save, sender=Producto)
+def autocompletar_producto(sender, instance, **kwargs):
+    autocompletado.actualizar('producto', instance.id, instance.nombre if instance.activo else None)
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=Marca)
+def autocompletar_taxonomia(sender, instance, **kwargs):
+    autocompletado.actualizar(sender.__name__.lower(), instance.id, instance.nombre)
+
+
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=Marca)
+def quitar_de_autocompletado(sender, instance, **kwargs):
+    autocompletado.actualizar(sender.__name__.lower(), instance.id)
+
+
+# Fragmentos cacheados de las tarjetas de producto
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=Marca)
+@receiver(post_save, sender=Material)
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=Marca)
+@receiver(post_delete, sender=Material)
+def invalidar_cache_catalogo(sender, instance, **kwargs):
+    cache_catalogo.invalidar()
+
+
+# Usuario cacheado por UsuarioActualMiddleware
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_usuario_cacheado(sender, instance, **kwargs):
+    invalidar_usuario(instance.id)
@@ -33,8 +33,8 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
-    // Botones de agregar al carrito
-    document.querySelectorAll('.btn-carrito').forEach(btn => {
+    // Botones de agregar al carrito (el enlace del menú no lleva producto)
+    document.querySelectorAll('.btn-carrito[data-producto]').forEach(btn => {
         btn.addEventListener('click', function() {
             const productoId = this.dataset.producto;
             agregarAlCarrito(productoId);
@@ -44,17 +44,15 @@ document.addEventListener('DOMContentLoaded', function() {
     // Botones de cantidad en carrito
     document.querySelectorAll('.btn-cantidad').forEach(btn => {
         btn.addEventListener('click', function() {
-            const itemId = this.closest('.carrito-item').dataset.item;
             const accion = this.dataset.accion;
-            actualizarCantidadCarrito(itemId, accion);
+            actualizarCantidadCarrito(this.closest('.carrito-item'), accion);
         });
     });
     
     // Botones de eliminar del carrito
     document.querySelectorAll('.btn-eliminar').forEach(btn => {
         btn.addEventListener('click', function() {
-            const itemId = this.dataset.item;
-            eliminarDelCarrito(itemId, this.closest('.carrito-item'));
+            eliminarDelCarrito(this.closest('.carrito-item'));
         });
     });
     
@@ -92,133 +90,137 @@ function agregarFavorito(productoId, boton) {
     });
 }
 
-// Función para agregar al carrito
-function agregarAlCarrito(productoId) {
-    fetch(`/carrito/agregar/${productoId}/`, {
+// Carrito: los clics se acumulan y se envían juntos en una sola petición
+const RETRASO_CARRITO = 400;
+let operacionesCarrito = [];
+let temporizadorCarrito = null;
+let enviandoCarrito = false;
+
+function encolarOperacionCarrito(operacion, inmediato = false) {
+    if (operacion.accion === 'agregar') {
+        // Varios "agregar" seguidos del mismo producto se suman
+        const anterior = operacionesCarrito[operacionesCarrito.length - 1];
+        if (anterior && anterior.accion === 'agregar' && anterior.producto === operacion.producto) {
+            anterior.cantidad += operacion.cantidad;
+        } else {
+            operacionesCarrito.push(operacion);
+        }
+    } else {
+        // Fijar la cantidad o eliminar deja sin efecto lo anterior de ese producto
+        operacionesCarrito = operacionesCarrito.filter(op => op.producto !== operacion.producto);
+        operacionesCarrito.push(operacion);
+    }
+    
+    clearTimeout(temporizadorCarrito);
+    temporizadorCarrito = setTimeout(enviarCarrito, inmediato ? 0 : RETRASO_CARRITO);
+}
+
+function enviarCarrito() {
+    // Una petición cada vez: lo que llegue mientras tanto sale en la siguiente
+    if (enviandoCarrito || operacionesCarrito.length === 0) {
+        return;
+    }
+    const operaciones = operacionesCarrito;
+    operacionesCarrito = [];
+    enviandoCarrito = true;
+    
+    fetch('/carrito/lote/', {
         method: 'POST',
         headers: {
             'X-CSRFToken': getCSRFToken(),
             'Content-Type': 'application/json',
         },
+        body: JSON.stringify({operaciones: operaciones}),
     })
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            mostrarMensaje(data.message);
-            // Actualizar contador del carrito si existe
-            const contador = document.querySelector('.contador-carrito');
-            if (contador && data.carrito_count !== undefined) {
-                contador.textContent = data.carrito_count;
-            }
+            actualizarVistaCarrito(data, operaciones);
         } else {
             mostrarMensaje(data.message, 'error');
+            // No se aplicó nada: se vuelve a mostrar el carrito real
+            if (document.querySelector('.carrito-item')) {
+                setTimeout(() => location.reload(), 1500);
+            }
         }
     })
     .catch(error => {
         console.error('Error:', error);
-        mostrarMensaje('Error al agregar al carrito', 'error');
+        mostrarMensaje('Error al actualizar el carrito', 'error');
+    })
+    .finally(() => {
+        enviandoCarrito = false;
+        if (operacionesCarrito.length > 0) {
+            enviarCarrito();
+        }
     });
 }
 
-// Función para actualizar cantidad en carrito
-function actualizarCantidadCarrito(itemId, accion) {
-    const formData = new FormData();
-    formData.append('accion', accion);
+function actualizarVistaCarrito(data, operaciones) {
+    if (operaciones.some(op => op.accion === 'agregar')) {
+        mostrarMensaje('Producto agregado al carrito');
+    }
     
-    fetch(`/carrito/actualizar/${itemId}/`, {
-        method: 'POST',
-        headers: {
-            'X-CSRFToken': getCSRFToken(),
-        },
-        body: formData,
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            // Actualizar la cantidad en la interfaz
-            const item = document.querySelector(`[data-item="${itemId}"]`);
-            const cantidadSpan = item.querySelector('.cantidad-actual');
-            const subtotalSpan = item.querySelector('.item-total');
-            
-            if (cantidadSpan) cantidadSpan.textContent = data.nueva_cantidad;
-            if (subtotalSpan) subtotalSpan.textContent = `$${data.subtotal}`;
-            
-            // Recargar la página para actualizar totales (simple)
-            setTimeout(() => location.reload(), 500);
+    // Actualizar contador del carrito si existe
+    const contador = document.querySelector('.contador-carrito');
+    if (contador && data.carrito_count !== undefined) {
+        contador.textContent = data.carrito_count;
+    }
+    
+    const subtotal = document.querySelector('.resumen-subtotal');
+    const total = document.querySelector('.resumen-total');
+    if (subtotal) subtotal.textContent = `$${data.total}`;
+    if (total) total.textContent = `$${data.total}`;
+    
+    // Cantidades confirmadas, salvo las que el usuario ya volvió a cambiar
+    const pendientes = new Set(operacionesCarrito.map(op => op.producto));
+    Object.entries(data.productos).forEach(([productoId, estado]) => {
+        const item = document.querySelector(`.carrito-item[data-producto="${productoId}"]`);
+        if (!item || pendientes.has(Number(productoId))) {
+            return;
         }
-    })
-    .catch(error => {
-        console.error('Error:', error);
-        mostrarMensaje('Error al actualizar cantidad', 'error');
+        const cantidadSpan = item.querySelector('.cantidad-actual');
+        if (cantidadSpan) cantidadSpan.textContent = estado.cantidad;
     });
+    
+    if (data.carrito_count === 0 && document.querySelector('.carrito-items')) {
+        // Se vació el carrito: mostrar la página de carrito vacío
+        location.reload();
+    }
+}
+
+// Función para agregar al carrito
+function agregarAlCarrito(productoId) {
+    encolarOperacionCarrito({accion: 'agregar', producto: Number(productoId), cantidad: 1});
+}
+
+// Función para actualizar cantidad en carrito
+function actualizarCantidadCarrito(elemento, accion) {
+    const cantidadSpan = elemento.querySelector('.cantidad-actual');
+    const actual = parseInt(cantidadSpan.textContent);
+    const nueva = accion === 'incrementar' ? actual + 1 : Math.max(actual - 1, 1);
+    if (nueva === actual) {
+        return;
+    }
+    
+    // Se muestra ya; el servidor confirma o corrige al aplicar el lote
+    cantidadSpan.textContent = nueva;
+    encolarOperacionCarrito({accion: 'cantidad', producto: Number(elemento.dataset.producto), cantidad: nueva});
 }
 
 // Función para eliminar del carrito
-function eliminarDelCarrito(itemId, elemento) {
+function eliminarDelCarrito(elemento) {
     if (!confirm('¿Estás seguro de que quieres eliminar este producto del carrito?')) {
         return;
     }
     
-    fetch(`/carrito/eliminar/${itemId}/`, {
-        method: 'POST',
-        headers: {
-            'X-CSRFToken': getCSRFToken(),
-            'Content-Type': 'application/json',
-        },
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            mostrarMensaje(data.message);
-            // Eliminar el elemento de la interfaz
-            elemento.remove();
-            // Recargar para actualizar totales
-            setTimeout(() => location.reload(), 1000);
-        } else {
-            mostrarMensaje(data.message, 'error');
-        }
-    })
-    .catch(error => {
-        console.error('Error:', error);
-        mostrarMensaje('Error al eliminar del carrito', 'error');
-    });
+    elemento.remove();
+    mostrarMensaje('Producto eliminado del carrito');
+    encolarOperacionCarrito({accion: 'eliminar', producto: Number(elemento.dataset.producto)}, true);
 }
 
 // Función para obtener el token CSRF
 function getCSRFToken() {
     const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]');
     return csrfToken ? csrfToken.value : '';
-}
-
-// Función para actualizar cantidad en carrito
-function actualizarCantidadCarrito(itemId, accion) {
-    const formData = new FormData();
-    formData.append('accion', accion);
-    
-    fetch(`/carrito/actualizar/${itemId}/`, {
-        method: 'POST',
-        headers: {
-            'X-CSRFToken': getCSRFToken(),
-        },
-        body: formData,
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            // Actualizar la cantidad en la interfaz
-            const item = document.querySelector(`[data-item="${itemId}"]`);
-            const cantidadSpan = item.querySelector('.cantidad-actual');
-            const subtotalSpan = item.querySelector('.item-total');
-            
-            if (cantidadSpan) cantidadSpan.textContent = data.nueva_cantidad;
-            if (subtotalSpan) subtotalSpan.textContent = `$${(data.nueva_cantidad * parseFloat(subtotalSpan.textContent.replace('$', '') / parseInt(cantidadSpan.textContent))).toFixed(2)}`;
-            
-            // Recargar la página para actualizar totales
-            setTimeout(() => location.reload(), 500);
-        }
-    })
-    .catch(error => {
-        console.error('Error:', error);
-        mostrarMensaje('Error al actualizar cantidad', 'error');
-    });
 }
\ No newline at end of file
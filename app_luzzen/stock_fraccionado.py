@@ -0,0 +1,182 @@
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import FraccionStock, Producto
+
+# Filas en que se reparte el stock de un producto al fraccionarlo
+FRACCIONES = getattr(settings, 'STOCK_FRACCIONES', 8)
+
+# Segundos que se reutiliza la suma de las fracciones en la comprobación de agotado
+DURACION_TOTAL = 5
+
+
+def _clave_total(producto_id):
+    return f'stock_fraccionado:{producto_id}'
+
+
+def _invalidar_total(producto_id):
+    # Al confirmar: si se borrara antes, otra petición podría volver a cachear
+    # la suma que aún no incluye este cambio
+    transaction.on_commit(lambda: cache.delete(_clave_total(producto_id)))
+
+
+def repartir(producto, fracciones=None):
+    """Reparte `producto.stock` entre las fracciones del producto.
+
+    Las unidades vendidas se acumulan en la fracción 0 para que la suma de
+    todas siga siendo el total. Sirve tanto para fraccionar un producto como
+    para cambiar su stock desde fuera de la tienda (las ventas que no se
+    hayan sincronizado se pierden; para corregir el stock está ajustar()).
+    """
+    with transaction.atomic():
+        existentes = FraccionStock.objects.select_for_update().filter(producto=producto)
+        vendidos = existentes.aggregate(total=Sum('vendidos'))['total']
+        if vendidos is None:
+            vendidos = producto.vendidos
+        if fracciones is None:
+            fracciones = existentes.count() or FRACCIONES
+        existentes.delete()
+
+        base, resto = divmod(max(int(producto.stock), 0), fracciones)
+        FraccionStock.objects.bulk_create([
+            FraccionStock(
+                producto=producto,
+                indice=indice,
+                stock=base + (1 if indice < resto else 0),
+                vendidos=vendidos if indice == 0 else 0,
+            )
+            for indice in range(fracciones)
+        ])
+        Producto.objects.filter(id=producto.id).update(stock_fraccionado=True, vendidos=vendidos)
+        _invalidar_total(producto.id)
+    producto.stock_fraccionado = True
+    producto.vendidos = vendidos
+
+
+def unificar(producto):
+    """Vuelve a guardar el stock en la fila del producto y borra las fracciones"""
+    with transaction.atomic():
+        sincronizar([producto.id])
+        FraccionStock.objects.filter(producto=producto).delete()
+        Producto.objects.filter(id=producto.id).update(stock_fraccionado=False)
+        _invalidar_total(producto.id)
+    producto.refresh_from_db(fields=['stock', 'vendidos', 'stock_fraccionado'])
+
+
+def total(producto_id):
+    """Stock real del producto fraccionado (suma de las fracciones)"""
+    return FraccionStock.objects.filter(producto_id=producto_id).aggregate(total=Sum('stock'))['total'] or 0
+
+
+def total_cacheado(producto_id):
+    """total() guardado unos segundos en la caché compartida.
+
+    Lo borran al confirmarse descontar(), ajustar(), repartir() y unificar().
+    Solo sirve para rechazar compras de un producto agotado: un valor
+    antiguo por encima del real no vende de más (descontar() vuelve a mirar
+    las fracciones) y uno por debajo dura como mucho DURACION_TOTAL.
+    """
+    clave = _clave_total(producto_id)
+    valor = cache.get(clave)
+    if valor is None:
+        valor = total(producto_id)
+        cache.set(clave, valor, DURACION_TOTAL)
+    return valor
+
+
+def ajustar(producto, diferencia):
+    """Suma `diferencia` unidades al stock fraccionado (o las resta, si es negativa).
+
+    Parte de las fracciones tal como están, así que las ventas hechas mientras
+    tanto se respetan. Al restar no se baja de cero. Devuelve el stock resultante.
+    """
+    with transaction.atomic():
+        fracciones = list(FraccionStock.objects.select_for_update().filter(producto=producto).order_by('indice'))
+        if not fracciones:
+            return 0
+        if diferencia > 0:
+            base, resto = divmod(diferencia, len(fracciones))
+            for indice, fraccion in enumerate(fracciones):
+                fraccion.stock += base + (1 if indice < resto else 0)
+        else:
+            restante = -diferencia
+            for fraccion in sorted(fracciones, key=lambda fraccion: -fraccion.stock):
+                quitado = min(fraccion.stock, restante)
+                fraccion.stock -= quitado
+                restante -= quitado
+        FraccionStock.objects.bulk_update(fracciones, ['stock'])
+        _invalidar_total(producto.id)
+    return sum(fraccion.stock for fraccion in fracciones)
+
+
+def descontar(producto_id, cantidad, reservado=0):
+    """Descuenta `cantidad` del stock fraccionado; False si no hay suficiente.
+
+    Debe llamarse dentro de una transacción. `reservado` son las unidades
+    apartadas por otros carritos, que no se pueden vender. Sin reservas ajenas
+    prueba las fracciones en orden aleatorio con un UPDATE condicionado cada
+    una, de modo que compras simultáneas casi nunca escriben la misma fila. Si
+    hay reservas (el límite depende de la suma, no de cada fracción) o ninguna
+    fracción cubre la cantidad por sí sola, se bloquean todas y se descuenta de varias.
+    """
+    # Agotado: durante una venta masiva la mayoría de compras acaban aquí sin consultar la base de datos
+    if total_cacheado(producto_id) - reservado < cantidad:
+        return False
+
+    existencias = dict(
+        FraccionStock.objects.filter(producto_id=producto_id, stock__gt=0).values_list('indice', 'stock')
+    )
+    if sum(existencias.values()) - reservado < cantidad:
+        return False
+
+    if not reservado:
+        indices = list(existencias)
+        random.shuffle(indices)
+        for indice in indices:
+            if FraccionStock.objects.filter(
+                producto_id=producto_id, indice=indice, stock__gte=cantidad
+            ).update(stock=F('stock') - cantidad, vendidos=F('vendidos') + cantidad):
+                _invalidar_total(producto_id)
+                return True
+
+    fracciones = list(
+        FraccionStock.objects.select_for_update().filter(producto_id=producto_id, stock__gt=0).order_by('indice')
+    )
+    if sum(fraccion.stock for fraccion in fracciones) - reservado < cantidad:
+        return False
+    restante = cantidad
+    for fraccion in fracciones:
+        tomado = min(fraccion.stock, restante)
+        fraccion.stock -= tomado
+        fraccion.vendidos += tomado
+        restante -= tomado
+        if not restante:
+            break
+    FraccionStock.objects.bulk_update(fracciones, ['stock', 'vendidos'])
+    _invalidar_total(producto_id)
+    return True
+
+
+def sincronizar(producto_ids=None):
+    """Copia la suma de las fracciones en Producto.stock y Producto.vendidos.
+
+    Es la copia que usan el catálogo, los filtros y las reservas; se lanza de
+    forma periódica (comando sincronizar_stock). Solo escribe los productos
+    cuya copia no coincide y devuelve sus ids.
+    """
+    fracciones = FraccionStock.objects.filter(producto=OuterRef('pk')).order_by().values('producto')
+    suma_stock = Subquery(fracciones.annotate(suma=Sum('stock')).values('suma'))
+    suma_vendidos = Subquery(fracciones.annotate(suma=Sum('vendidos')).values('suma'))
+    productos = Producto.objects.filter(stock_fraccionado=True)
+    if producto_ids is not None:
+        productos = productos.filter(id__in=producto_ids)
+    stock, vendidos = Coalesce(suma_stock, 0), Coalesce(suma_vendidos, 0)
+    cambiados = list(productos.exclude(stock=stock, vendidos=vendidos).values_list('id', flat=True))
+    if cambiados:
+        Producto.objects.filter(id__in=cambiados).update(stock=stock, vendidos=vendidos)
+    return cambiados
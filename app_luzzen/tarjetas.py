@@ -0,0 +1,49 @@
+from django.db.models.functions import Substr
+
+from .models import Producto
+
+# Columnas que necesita una tarjeta de producto en los listados. La descripción
+# completa no se lee: la base de datos devuelve solo un resumen recortado.
+CAMPOS = ('id', 'nombre', 'precio', 'stock', 'imagen', 'categoria_id', 'marca_id', 'material_id')
+LONGITUD_RESUMEN = 200
+
+_almacenamiento = Producto._meta.get_field('imagen').storage
+
+
+class TarjetaProducto:
+    """Datos mínimos para pintar un producto en un listado"""
+
+    __slots__ = (
+        'id', 'nombre', 'precio', 'stock', 'imagen', 'imagen_url', 'resumen',
+        'categoria_id', 'marca_id', 'material_id', 'fila_id',
+    )
+
+    def __init__(self, fila, prefijo=''):
+        for campo in CAMPOS:
+            setattr(self, campo, fila[prefijo + campo])
+        self.imagen_url = _almacenamiento.url(self.imagen) if self.imagen else ''
+        self.resumen = fila['resumen'] or ''
+        # id de la fila consultada (p. ej. el Favorito cuando se lista desde ahí)
+        self.fila_id = fila['id']
+
+
+def valores(queryset, *extra, prefijo=''):
+    """Convierte el queryset en uno de diccionarios con las columnas de la tarjeta.
+
+    extra añade columnas adicionales (p. ej. el campo de orden para paginar).
+    """
+    columnas = [prefijo + campo for campo in CAMPOS if prefijo + campo != 'id']
+    return queryset.values(
+        'id', *columnas, *extra,
+        resumen=Substr(prefijo + 'descripcion', 1, LONGITUD_RESUMEN),
+    )
+
+
+def construir(filas, prefijo=''):
+    return [TarjetaProducto(fila, prefijo) for fila in filas]
+
+
+def proyectar(queryset, prefijo=''):
+    """Lista de TarjetaProducto a partir de un queryset de productos (o de una
+    relación hacia Producto, indicando el prefijo, p. ej. 'producto__')"""
+    return construir(valores(queryset, prefijo=prefijo), prefijo)
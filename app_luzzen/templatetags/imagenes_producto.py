@@ -0,0 +1,43 @@
+from django import template
+from django.utils.html import format_html
+
+from .. import imagenes
+
+register = template.Library()
+
+# Ancho con que se muestra cada variante, para que el navegador elija del srcset
+TAMANOS = {
+    'thumb': '160px',
+    'card': '(max-width: 600px) 100vw, 400px',
+    'detail': '(max-width: 900px) 100vw, 900px',
+}
+
+
+def _srcset(nombre, extension):
+    return ', '.join(f'{url} {ancho}w' for url, ancho in imagenes.urls_derivadas(nombre, extension))
+
+
+@register.simple_tag
+def imagen_producto(imagen, variante='card', alt='', clase=''):
+    """<picture> con las derivadas WebP/JPEG de la imagen y carga diferida.
+
+    `imagen` puede ser el FieldFile del producto o el nombre guardado en la
+    base de datos. Si aún no hay derivadas se usa la imagen original.
+    """
+    nombre = getattr(imagen, 'name', imagen) or ''
+    if not imagenes.tiene_derivadas(nombre):
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy" decoding="async">',
+            imagenes.url_original(nombre), alt, clase,
+        )
+
+    tamanos = TAMANOS[variante]
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy" decoding="async">'
+        '</picture>',
+        _srcset(nombre, 'webp'), tamanos,
+        imagenes.url_derivada(nombre, variante, 'jpg'),
+        _srcset(nombre, 'jpg'), tamanos, alt, clase,
+    )
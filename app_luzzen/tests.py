@@ -1,3 +1,336 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.templatetags.static import static
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import carrito, checkout, stock_fraccionado
+from .models import Categoria, FraccionStock, ItemPedido, Marca, Material, Pedido, Producto, Reserva, Usuario
+
+# Las pruebas no deben tocar la caché compartida de los procesos de verdad
+CACHE_LOCAL = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+    for alias in ('default', 'versiones', 'sesiones')
+}
+
+
+def en_paralelo(funcion, argumentos, hilos=8):
+    """Llama a funcion(argumento) para cada argumento desde `hilos` hilos que arrancan a la vez.
+
+    Devuelve el resultado o la excepción de cada llamada, en el orden de `argumentos`.
+    """
+    resultados = [None] * len(argumentos)
+    pendientes = list(enumerate(argumentos))
+    bloqueo = threading.Lock()
+    salida = threading.Barrier(hilos)
+
+    def trabajar():
+        try:
+            salida.wait()
+            while True:
+                with bloqueo:
+                    if not pendientes:
+                        return
+                    posicion, argumento = pendientes.pop()
+                try:
+                    resultados[posicion] = funcion(argumento)
+                except Exception as e:
+                    resultados[posicion] = e
+        finally:
+            connection.close()
+
+    grupo = [threading.Thread(target=trabajar) for _ in range(hilos)]
+    for hilo in grupo:
+        hilo.start()
+    for hilo in grupo:
+        hilo.join()
+    return resultados
+
+
+def crear_producto(stock, **campos):
+    return Producto.objects.create(
+        nombre='Lámpara de prueba', descripcion='-', precio=10, stock=stock,
+        categoria=Categoria.objects.create(nombre='Lámparas'),
+        marca=Marca.objects.create(nombre='LuzZen'),
+        material=Material.objects.create(nombre='Vidrio', precio=1),
+        **campos,
+    )
+
+
+def crear_usuarios(cantidad):
+    return [
+        Usuario.objects.create(nombre=f'Cliente {i}', email=f'cliente{i}@luzzen.local', contraseña='-', pais='-', direccion='-')
+        for i in range(cantidad)
+    ]
+
+
+def crear_carritos(producto, cantidad_por_pedido, clientes):
+    pedidos = [Pedido.objects.create(cliente=cliente) for cliente in clientes]
+    ItemPedido.objects.bulk_create([
+        ItemPedido(pedido=pedido, producto=producto, cantidad=cantidad_por_pedido, precio_unitario=producto.precio)
+        for pedido in pedidos
+    ])
+    return pedidos
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class CheckoutConcurrenteTests(TransactionTestCase):
+    """Compras simultáneas del mismo producto (completar_pedido desde varios hilos)"""
+
+    def comprobar_ventas(self, producto, stock, pedidos, cantidad):
+        resultados = en_paralelo(checkout.completar_pedido, pedidos)
+
+        errores = [r for r in resultados if isinstance(r, Exception) and not isinstance(r, checkout.StockInsuficiente)]
+        self.assertEqual(errores, [])
+        completados = [r for r in resultados if not isinstance(r, Exception)]
+        esperados = min(len(pedidos), stock // cantidad)
+        self.assertEqual(len(completados), esperados)
+        self.assertEqual(Pedido.objects.filter(estado='completado').count(), esperados)
+        self.assertEqual(Pedido.objects.filter(estado='pendiente').count(), len(pedidos) - esperados)
+
+        producto.refresh_from_db()
+        self.assertGreaterEqual(producto.stock, 0)
+        self.assertEqual(producto.stock, stock - esperados * cantidad)
+        self.assertEqual(producto.vendidos, esperados * cantidad)
+
+    def test_no_vende_mas_stock_del_disponible(self):
+        producto = crear_producto(stock=5)
+        pedidos = crear_carritos(producto, 1, crear_usuarios(16))
+        self.comprobar_ventas(producto, 5, pedidos, 1)
+
+    def test_pedidos_de_varias_unidades(self):
+        producto = crear_producto(stock=7)
+        pedidos = crear_carritos(producto, 3, crear_usuarios(8))
+        self.comprobar_ventas(producto, 7, pedidos, 3)
+
+    def test_el_mismo_carrito_se_completa_una_vez(self):
+        producto = crear_producto(stock=10)
+        pedido, = crear_carritos(producto, 1, crear_usuarios(1))
+
+        resultados = en_paralelo(checkout.completar_pedido, [pedido] * 8)
+
+        self.assertEqual(len([r for r in resultados if not isinstance(r, Exception)]), 1)
+        self.assertTrue(all(isinstance(r, checkout.PedidoNoPendiente) for r in resultados if isinstance(r, Exception)))
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 9)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class StockFraccionadoConcurrenteTests(TransactionTestCase):
+    """Compras simultáneas de un producto con el stock repartido en fracciones"""
+
+    def vender(self, stock, reservado=0):
+        producto = crear_producto(stock=stock)
+        stock_fraccionado.repartir(producto, 4)
+        clientes = crear_usuarios(17)
+        if reservado:
+            otro, = crear_carritos(producto, reservado, clientes[-1:])
+            Reserva.objects.create(
+                pedido=otro, producto=producto, cantidad=reservado, expira=timezone.now() + timedelta(hours=1),
+            )
+        pedidos = crear_carritos(producto, 1, clientes[:16])
+
+        resultados = en_paralelo(checkout.completar_pedido, pedidos)
+
+        errores = [r for r in resultados if isinstance(r, Exception) and not isinstance(r, checkout.StockInsuficiente)]
+        self.assertEqual(errores, [])
+        stock_fraccionado.sincronizar([producto.id])
+        producto.refresh_from_db()
+        return len([r for r in resultados if not isinstance(r, Exception)]), producto
+
+    def test_no_vende_mas_stock_del_disponible(self):
+        completados, producto = self.vender(stock=10)
+        self.assertEqual(completados, 10)
+        self.assertEqual(producto.stock, 0)
+        self.assertEqual(producto.vendidos, 10)
+        self.assertFalse(FraccionStock.objects.filter(producto=producto, stock__lt=0).exists())
+
+    def test_respeta_las_reservas_de_otros_carritos(self):
+        completados, producto = self.vender(stock=10, reservado=3)
+        self.assertEqual(completados, 7)
+        self.assertEqual(producto.stock, 3)
+
+    def test_ajustar_respeta_las_ventas(self):
+        producto = crear_producto(stock=10)
+        stock_fraccionado.repartir(producto, 4)
+        with transaction.atomic():
+            self.assertTrue(stock_fraccionado.descontar(producto.id, 4))
+        # El admin vio 10 y puso 15: se suman 5 a los 6 que quedan
+        self.assertEqual(stock_fraccionado.ajustar(producto, 5), 11)
+        self.assertEqual(stock_fraccionado.ajustar(producto, -20), 0)
+        self.assertEqual(stock_fraccionado.total(producto.id), 0)
+
+    def test_agotado_se_rechaza_con_el_total_cacheado(self):
+        producto = crear_producto(stock=1)
+        stock_fraccionado.repartir(producto, 4)
+        with transaction.atomic():
+            self.assertTrue(stock_fraccionado.descontar(producto.id, 1))
+        self.assertEqual(stock_fraccionado.total_cacheado(producto.id), 0)
+
+        with self.assertNumQueries(0):
+            self.assertFalse(stock_fraccionado.descontar(producto.id, 1))
+        # Reponer borra el total al confirmarse y la compra vuelve a entrar
+        stock_fraccionado.ajustar(producto, 2)
+        with transaction.atomic():
+            self.assertTrue(stock_fraccionado.descontar(producto.id, 1))
+        self.assertEqual(stock_fraccionado.total(producto.id), 1)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class CarritoUnicoTests(TransactionTestCase):
+    """Un solo carrito abierto por cliente aunque lo pidan varias peticiones a la vez"""
+
+    def test_peticiones_simultaneas_reciben_el_mismo_carrito(self):
+        usuario, = crear_usuarios(1)
+        for _ in range(5):
+            Pedido.objects.filter(cliente=usuario).delete()
+
+            resultados = en_paralelo(carrito.obtener_carrito, [usuario] * 16)
+
+            self.assertFalse([r for r in resultados if isinstance(r, Exception)])
+            self.assertEqual(len({pedido.id for pedido in resultados}), 1)
+            self.assertEqual(Pedido.objects.filter(cliente=usuario, estado='pendiente').count(), 1)
+
+    def test_reintenta_si_otra_peticion_lo_creo_antes(self):
+        usuario, = crear_usuarios(1)
+        existente = Pedido.objects.create(cliente=usuario)
+        filtrar = Pedido.objects.filter
+        # La primera lectura no ve el carrito (la otra petición aún no había terminado):
+        # el INSERT choca con pedido_carrito_unico y la segunda lectura lo encuentra
+        lecturas = [Pedido.objects.none()]
+
+        def filtrar_tarde(*args, **kwargs):
+            return lecturas.pop() if lecturas else filtrar(*args, **kwargs)
+
+        with mock.patch.object(Pedido.objects, 'filter', side_effect=filtrar_tarde) as filtro:
+            pedido = carrito.obtener_carrito(usuario)
+
+        self.assertEqual(pedido.id, existente.id)
+        self.assertEqual(filtro.call_count, 2)
+        self.assertEqual(Pedido.objects.filter(cliente=usuario, estado='pendiente').count(), 1)
+
+    def test_se_rinde_tras_los_intentos(self):
+        usuario, = crear_usuarios(1)
+        Pedido.objects.create(cliente=usuario)
+
+        with mock.patch.object(Pedido.objects, 'filter', return_value=Pedido.objects.none()) as filtro:
+            with self.assertRaises(carrito.ErrorCarrito):
+                carrito.obtener_carrito(usuario, intentos=3)
+
+        self.assertEqual(filtro.call_count, 3)
+        self.assertEqual(Pedido.objects.filter(cliente=usuario).count(), 1)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class UsuarioActualTests(TestCase):
+    """Usuario de la sesión guardado en la caché compartida entre peticiones"""
+
+    def consultas_de_usuario(self, cliente):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = cliente.get(reverse('perfil'))
+        return respuesta, [c for c in consultas.captured_queries if 'app_luzzen_usuario' in c['sql']]
+
+    def test_la_segunda_peticion_no_consulta_el_usuario(self):
+        usuario, = crear_usuarios(1)
+        cliente = Client()
+        cliente.post(reverse('login'), {'email': usuario.email, 'password': usuario.contraseña})
+
+        respuesta, consultas = self.consultas_de_usuario(cliente)
+        self.assertEqual(respuesta.status_code, 200)
+        respuesta, consultas = self.consultas_de_usuario(cliente)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(consultas, [])
+
+    def test_un_usuario_borrado_deja_de_estar_autenticado(self):
+        usuario, = crear_usuarios(1)
+        cliente = Client()
+        cliente.post(reverse('login'), {'email': usuario.email, 'password': usuario.contraseña})
+        self.assertEqual(cliente.get(reverse('perfil')).status_code, 200)
+
+        usuario.delete()
+
+        self.assertRedirects(cliente.get(reverse('perfil')), reverse('login'), fetch_redirect_response=False)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class SesionesTests(TestCase):
+    """Escrituras en la tabla de sesiones por petición con cada almacenamiento de sesión"""
+
+    MENSAJES_SESION = 'django.contrib.messages.storage.session.SessionStorage'
+    MENSAJES_COOKIE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+    def setUp(self):
+        self.usuario, = crear_usuarios(1)
+
+    def escrituras_por_peticion(self, motor, mensajes):
+        """Recorre el flujo de un cliente (entrar, ver páginas, un error con mensaje, salir)"""
+        with override_settings(SESSION_ENGINE=motor, MESSAGE_STORAGE=mensajes):
+            # El cliente se crea dentro de override_settings: lee el motor al crearse
+            cliente = Client()
+            peticiones = escrituras = 0
+
+            def pedir(metodo, url, datos=None):
+                nonlocal peticiones, escrituras
+                with CaptureQueriesContext(connection) as consultas:
+                    respuesta = getattr(cliente, metodo)(url, datos or {})
+                self.assertLess(respuesta.status_code, 400, f'{metodo.upper()} {url}')
+                peticiones += 1
+                escrituras += len([
+                    c for c in consultas.captured_queries
+                    if 'django_session' in c['sql'] and not c['sql'].lstrip().upper().startswith('SELECT')
+                ])
+
+            pedir('post', reverse('login'), {'email': self.usuario.email, 'password': self.usuario.contraseña})
+            pedir('get', reverse('index'))
+            for _ in range(5):
+                pedir('get', reverse('perfil'))
+            pedir('get', reverse('carrito'))
+            # Carrito vacío: el pago falla con un mensaje y redirige al carrito
+            pedir('post', reverse('procesar_pago'))
+            pedir('get', reverse('carrito'))
+            pedir('post', reverse('logout'))
+            pedir('get', reverse('index'))
+        return escrituras / peticiones
+
+    def test_escrituras_por_motor(self):
+        motores = settings.MOTORES_SESION
+        anterior = self.escrituras_por_peticion(motores['db'], self.MENSAJES_SESION)
+        db = self.escrituras_por_peticion(motores['db'], self.MENSAJES_COOKIE)
+        cache = self.escrituras_por_peticion(motores['cache'], self.MENSAJES_COOKIE)
+        cookie = self.escrituras_por_peticion(motores['cookie'], self.MENSAJES_COOKIE)
+
+        self.assertGreater(anterior, 0)
+        self.assertLess(db, anterior)
+        self.assertLessEqual(cache, db)
+        self.assertEqual(cookie, 0)
+
+
+class EstaticosTests(SimpleTestCase):
+    """Enlaces a estáticos con DEBUG = False, antes y después de collectstatic"""
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def test_sin_collectstatic_se_enlaza_el_nombre_sin_hash(self):
+        with override_settings(DEBUG=False, STATIC_ROOT=self.directorio):
+            self.assertEqual(static('css/styles.css'), '/stati/css/styles.css')
+
+    def test_collectstatic_anade_el_hash_y_la_copia_comprimida(self):
+        with override_settings(DEBUG=False, STATIC_ROOT=self.directorio):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            url = static('css/styles.css')
+
+        self.assertRegex(url, r'^/stati/css/styles\.[0-9a-f]{12}\.css$')
+        ruta = os.path.join(self.directorio, url.removeprefix('/stati/'))
+        self.assertTrue(os.path.exists(ruta + '.gz'))
@@ -0,0 +1,44 @@
+import re
+import unicodedata
+
+
+def normalizar(texto):
+    """Pasa el texto a minúsculas, sin acentos y con un solo espacio entre palabras"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', sin_acentos.lower()))
+
+
+def trigramas_palabra(palabra):
+    """Trigramas de una palabra rellenada como en pg_trgm ("  pal ")"""
+    relleno = f'  {palabra} '
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def trigramas(texto):
+    """Conjunto de trigramas de todas las palabras del texto"""
+    resultado = set()
+    for palabra in normalizar(texto).split():
+        resultado |= trigramas_palabra(palabra)
+    return resultado
+
+
+def similitud(a, b):
+    """Similitud de Jaccard entre dos conjuntos de trigramas"""
+    if not a or not b:
+        return 0.0
+    comunes = len(a & b)
+    return comunes / (len(a) + len(b) - comunes)
+
+
+def similitud_palabras(consulta, texto):
+    """Media, por palabra de la consulta, de su mejor similitud con una palabra del texto"""
+    palabras_texto = [trigramas_palabra(p) for p in normalizar(texto).split()]
+    palabras_consulta = [trigramas_palabra(p) for p in normalizar(consulta).split()]
+    if not palabras_texto or not palabras_consulta:
+        return 0.0
+    total = sum(
+        max(similitud(palabra, otra) for otra in palabras_texto)
+        for palabra in palabras_consulta
+    )
+    return total / len(palabras_consulta)
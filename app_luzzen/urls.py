@@ -5,6 +5,7 @@ urlpatterns = [
     # Páginas Públicas
     path('', views.index, name='index'),
     path('catalogo/', views.catalogo, name='catalogo'),
+    path('catalogo/autocompletar/', views.autocompletar, name='autocompletar'),
     path('producto/<int:producto_id>/', views.detalle_producto, name='detalle_producto'),
     
     # Autenticación
@@ -61,6 +62,7 @@ urlpatterns = [
     path('carrito/agregar/<int:producto_id>/', views.agregar_carrito, name='agregar_carrito'),
     path('carrito/actualizar/<int:item_id>/', views.actualizar_carrito, name='actualizar_carrito'),
     path('carrito/eliminar/<int:item_id>/', views.eliminar_del_carrito, name='eliminar_del_carrito'),
+    path('carrito/lote/', views.actualizar_carrito_lote, name='actualizar_carrito_lote'),
 
     # Añade esta URL con las demás
     path('carrito/proceder-pago/', views.proceder_pago, name='proceder_pago'),
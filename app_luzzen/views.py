@@ -2,16 +2,23 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Q, Count, Sum
+from django.db.models import Count, Sum, Prefetch
 from .models import *
+from . import autocompletado, busqueda, cache_catalogo, checkout, cola_imagenes, facetas, imagenes, paginacion, reservas, stock_fraccionado, tarjetas
+from . import carrito as carrito_compras
+from .middleware import usuario_o_404
+import json
 from django.http import JsonResponse
+from django.urls import reverse
 from functools import wraps
+from decimal import Decimal, InvalidOperation
 
 # Decorador para verificar si el usuario está autenticado
 def login_required_custom(view_func):
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        if not request.session.get('usuario_id'):
+        # request.usuario (UsuarioActualMiddleware) también descarta sesiones de usuarios borrados
+        if not request.usuario:
             messages.error(request, 'Debes iniciar sesión para acceder a esta página')
             return redirect('login')
         return view_func(request, *args, **kwargs)
@@ -21,7 +28,7 @@ def login_required_custom(view_func):
 def admin_required(view_func):
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        if not request.session.get('usuario_id'):
+        if not request.usuario:
             messages.error(request, 'Debes iniciar sesión para acceder a esta página')
             return redirect('login')
         if not request.session.get('es_admin'):
@@ -34,59 +41,145 @@ def admin_required(view_func):
 def es_administrador(user):
     return user.is_authenticated and user.is_staff
 
+def _leer_precio(valor):
+    """Convierte un parámetro de precio en Decimal, o None si no es válido"""
+    try:
+        precio = Decimal(valor)
+    except (TypeError, InvalidOperation):
+        return None
+    return precio if precio.is_finite() and precio >= 0 else None
+
 # Vistas Públicas
+@cache_catalogo.cache_pagina_anonima
 def index(request):
     """Página principal"""
     categorias = Categoria.objects.all()[:3]
-    productos_destacados = Producto.objects.filter(activo=True)[:6]
+    version_catalogo = cache_catalogo.version()
+    # Un solo proceso recalcula los destacados al caducar; el resto sirve los anteriores
+    productos_destacados = cache_catalogo.obtener(
+        'index:destacados',
+        lambda: tarjetas.proyectar(Producto.objects.filter(activo=True)[:6]),
+        cache_catalogo.DURACION_DATOS,
+        version_catalogo,
+    )
     
     context = {
         'categorias': categorias,
         'productos_destacados': productos_destacados,
+        'version_catalogo': version_catalogo,
+        'duracion_tarjetas': cache_catalogo.DURACION_TARJETAS,
     }
     return render(request, 'index.html', context)
 
+@cache_catalogo.cache_pagina_anonima
 def catalogo(request):
     """Catálogo de productos con filtros"""
-    productos = Producto.objects.filter(activo=True)
+    # activo IN (1) en vez de la expresión booleana sola: así SQLite puede usar
+    # los índices (activo, campo de orden, id) para ordenar y paginar
+    productos = Producto.objects.filter(activo__in=[True])
     
     # Filtros
-    categoria_id = request.GET.get('categoria')
-    marca_id = request.GET.get('marca')
-    material_id = request.GET.get('material')
+    seleccion = facetas.leer_seleccion(request.GET)
     buscar = request.GET.get('buscar')
-    
-    if categoria_id:
-        productos = productos.filter(categoria_id=categoria_id)
-    if marca_id:
-        productos = productos.filter(marca_id=marca_id)
-    if material_id:
-        productos = productos.filter(material_id=material_id)
+    precio_min = _leer_precio(request.GET.get('precio_min'))
+    precio_max = _leer_precio(request.GET.get('precio_max'))
+    en_stock = bool(request.GET.get('en_stock'))
+    
+    if precio_min is not None:
+        productos = productos.filter(precio__gte=precio_min)
+    if precio_max is not None:
+        productos = productos.filter(precio__lte=precio_max)
+    if en_stock:
+        productos = productos.filter(stock__gt=0)
     if buscar:
-        productos = productos.filter(
-            Q(nombre__icontains=buscar) | 
-            Q(descripcion__icontains=buscar)
-        )
-    
-    categorias = Categoria.objects.all()
-    marcas = Marca.objects.all()
-    materiales = Material.objects.all()
+        # Índice de texto completo con ranking BM25
+        productos = busqueda.filtrar(productos, buscar)
+    
+    # Conteos por faceta en una sola consulta agrupada
+    conteos, total_productos = facetas.contar(productos, seleccion)
+    productos = facetas.aplicar(productos, seleccion)
+    
+    # Orden y paginación por cursor
+    orden = request.GET.get('orden')
+    if orden not in paginacion.ORDENES or (orden == 'relevancia' and not buscar):
+        orden = 'relevancia' if buscar else 'recientes'
+    # Solo las columnas de la tarjeta más el campo de orden, que necesita el cursor
+    campo_orden = paginacion.ORDENES[orden][0]
+    filas, cursor_siguiente = paginacion.paginar(
+        tarjetas.valores(productos, campo_orden), orden, request.GET.get('cursor')
+    )
+    productos = tarjetas.construir(filas)
+    
+    url_siguiente = None
+    if cursor_siguiente:
+        parametros = request.GET.copy()
+        parametros['cursor'] = cursor_siguiente
+        url_siguiente = f'?{parametros.urlencode()}'
+    url_primera = None
+    if request.GET.get('cursor'):
+        parametros = request.GET.copy()
+        del parametros['cursor']
+        url_primera = f'?{parametros.urlencode()}'
+    
+    categorias = list(Categoria.objects.all())
+    marcas = list(Marca.objects.all())
+    materiales = list(Material.objects.all())
+    for faceta, opciones in (('categoria', categorias), ('marca', marcas), ('material', materiales)):
+        for opcion in opciones:
+            opcion.total = conteos[faceta].get(opcion.id, 0)
+            opcion.seleccionada = opcion.id in seleccion[faceta]
     
     context = {
         'productos': productos,
         'categorias': categorias,
         'marcas': marcas,
         'materiales': materiales,
+        'buscar': buscar or '',
+        'precio_min': precio_min,
+        'precio_max': precio_max,
+        'en_stock': en_stock,
+        'total_productos': total_productos,
+        'orden': orden,
+        'ordenes': [
+            (clave, etiqueta) for clave, (_, _, etiqueta) in paginacion.ORDENES.items()
+            if clave != 'relevancia' or buscar
+        ],
+        'url_siguiente': url_siguiente,
+        'url_primera': url_primera,
+        'version_catalogo': cache_catalogo.version(),
+        'duracion_tarjetas': cache_catalogo.DURACION_TARJETAS,
     }
     return render(request, 'catalogo.html', context)
 
+def autocompletar(request):
+    """Sugerencias para el buscador del catálogo (índice en memoria)"""
+    sugerencias = []
+    for tipo, objeto_id, texto in autocompletado.sugerir(request.GET.get('q', '')):
+        if tipo == 'producto':
+            url = reverse('detalle_producto', args=[objeto_id])
+        else:
+            url = f"{reverse('catalogo')}?{tipo}={objeto_id}"
+        sugerencias.append({'texto': texto, 'tipo': tipo, 'url': url})
+    
+    return JsonResponse({'sugerencias': sugerencias})
+
+@cache_catalogo.cache_pagina_anonima
 def detalle_producto(request, producto_id):
     """Detalle de un producto específico"""
-    producto = get_object_or_404(Producto, id=producto_id, activo=True)
-    relacionados = Producto.objects.filter(
-        categoria=producto.categoria, 
-        activo=True
-    ).exclude(id=producto.id)[:4]
+    def cargar():
+        producto = get_object_or_404(
+            Producto.objects.select_related('categoria', 'marca', 'material'),
+            id=producto_id, activo=True,
+        )
+        relacionados = tarjetas.proyectar(Producto.objects.filter(
+            categoria=producto.categoria, 
+            activo=True
+        ).exclude(id=producto.id)[:4])
+        return producto, relacionados
+    
+    producto, relacionados = cache_catalogo.obtener(
+        f'detalle_producto:{producto_id}', cargar, cache_catalogo.DURACION_DATOS, cache_catalogo.version()
+    )
     
     context = {
         'producto': producto,
@@ -178,8 +271,7 @@ def logout_view(request):
 @login_required_custom
 def perfil(request):
     """Perfil del usuario"""
-    usuario_id = request.session.get('usuario_id')
-    usuario = get_object_or_404(Usuario, id=usuario_id)
+    usuario = usuario_o_404(request)
     
     pedidos_activos = Pedido.objects.filter(cliente=usuario, estado='pendiente').count()
     total_favoritos = Favorito.objects.filter(cliente=usuario).count()
@@ -199,25 +291,25 @@ def perfil(request):
 @login_required_custom
 def carrito(request):
     """Carrito de compras del usuario"""
-    usuario_id = request.session.get('usuario_id')
-    usuario = get_object_or_404(Usuario, id=usuario_id)
+    usuario = usuario_o_404(request)
     
     # Obtener o crear pedido pendiente (carrito)
-    pedido, created = Pedido.objects.get_or_create(
-        cliente=usuario,
-        estado='pendiente',  # Esto es el carrito
-        defaults={'total': 0}
+    try:
+        pedido = carrito_compras.obtener_carrito(usuario)
+    except carrito_compras.ErrorCarrito as e:
+        messages.error(request, str(e))
+        return redirect('catalogo')
+    
+    # El total se mantiene al modificar el carrito, no hace falta recalcularlo
+    items = reservas.anotar_disponible(
+        pedido.items.select_related('producto'), producto='producto_id', stock='producto__stock', pedido=pedido
     )
     
-    items = pedido.items.all()
-    subtotal = sum(item.cantidad * item.precio_unitario for item in items)
-    total = subtotal
-    
     context = {
         'items': items,
         'pedido': pedido,
-        'subtotal': subtotal,
-        'total': total,
+        'subtotal': pedido.total,
+        'total': pedido.total,
     }
     return render(request, 'carrito.html', context)
 
@@ -225,32 +317,18 @@ def carrito(request):
 def proceder_pago(request):
     """Convertir carrito en pedido real"""
     if request.method == 'POST':
-        usuario_id = request.session.get('usuario_id')
-        usuario = get_object_or_404(Usuario, id=usuario_id)
-        
-        # Obtener el pedido pendiente (carrito)
-        pedido = get_object_or_404(Pedido, cliente=usuario, estado='pendiente')
+        usuario = usuario_o_404(request)
         
-        # Verificar que el carrito no esté vacío
-        if pedido.items.count() == 0:
-            messages.error(request, 'Tu carrito está vacío')
+        # Descuenta el stock y completa el carrito en una sola transacción. Con la
+        # clave del formulario, un envío repetido recibe el resultado del primero
+        try:
+            solicitud = checkout.pagar(usuario, request.POST.get('clave_pago', '')[:64])
+        except checkout.ErrorCheckout as e:
+            messages.error(request, str(e))
+            return redirect('carrito')
+        if solicitud.resultado != 'completado':
+            messages.error(request, solicitud.mensaje)
             return redirect('carrito')
-        
-        # Verificar stock de productos
-        for item in pedido.items.all():
-            if item.cantidad > item.producto.stock:
-                messages.error(request, f'No hay suficiente stock de {item.producto.nombre}')
-                return redirect('carrito')
-        
-        # Actualizar stock y cambiar estado del pedido
-        for item in pedido.items.all():
-            producto = item.producto
-            producto.stock -= item.cantidad
-            producto.save()
-        
-        # Cambiar estado a "completado" (pedido real)
-        pedido.estado = 'completado'
-        pedido.save()
         
         messages.success(request, '¡Compra realizada exitosamente!')
         return redirect('historial_pedidos')
@@ -260,24 +338,31 @@ def proceder_pago(request):
 @login_required_custom
 def favoritos(request):
     """Lista de productos favoritos del usuario"""
-    usuario_id = request.session.get('usuario_id')
-    usuario = get_object_or_404(Usuario, id=usuario_id)
+    usuario = usuario_o_404(request)
     
-    favoritos = Favorito.objects.filter(cliente=usuario)
+    # fila_id de cada tarjeta es el id del Favorito
+    favoritos = tarjetas.proyectar(Favorito.objects.filter(cliente=usuario), prefijo='producto__')
     
     context = {
         'favoritos': favoritos,
+        'version_catalogo': cache_catalogo.version(),
+        'duracion_tarjetas': cache_catalogo.DURACION_TARJETAS,
     }
     return render(request, 'favoritos.html', context)
 
 @login_required_custom
 def historial_pedidos(request):
     """Historial de pedidos del usuario"""
-    usuario_id = request.session.get('usuario_id')
-    usuario = get_object_or_404(Usuario, id=usuario_id)
+    usuario = usuario_o_404(request)
     
     # Solo mostrar pedidos completados (no los pendientes/carrito)
-    pedidos = Pedido.objects.filter(cliente=usuario, estado='completado').order_by('-fecha_creacion')
+    # Los artículos se precargan con solo las columnas que muestra la lista
+    items = ItemPedido.objects.select_related('producto').only(
+        'pedido_id', 'cantidad', 'producto__nombre', 'producto__imagen'
+    )
+    pedidos = Pedido.objects.filter(cliente=usuario, estado='completado').order_by(
+        '-fecha_creacion'
+    ).prefetch_related(Prefetch('items', queryset=items))
     
     context = {
         'pedidos': pedidos,
@@ -287,8 +372,7 @@ def historial_pedidos(request):
 @login_required_custom
 def detalle_pedido(request, pedido_id):
     """Detalle de un pedido específico"""
-    usuario_id = request.session.get('usuario_id')
-    usuario = get_object_or_404(Usuario, id=usuario_id)
+    usuario = usuario_o_404(request)
     
     pedido = get_object_or_404(Pedido, id=pedido_id, cliente=usuario)
     
@@ -325,7 +409,9 @@ def admin_dashboard(request):
 @admin_required
 def admin_productos(request):
     """Lista de productos para CRUD"""
-    productos = Producto.objects.select_related('categoria', 'marca', 'material').all()
+    productos = cola_imagenes.anotar_estado(
+        Producto.objects.select_related('categoria', 'marca', 'material').all()
+    )
     categorias = Categoria.objects.all()
     marcas = Marca.objects.all()
     
@@ -355,6 +441,8 @@ def admin_productos_crear(request):
             if 'imagen' in request.FILES:
                 producto.imagen = request.FILES['imagen']
                 producto.save()
+                # Las variantes se generan fuera de la petición (comando procesar_imagenes)
+                cola_imagenes.encolar(producto)
             
             messages.success(request, 'Producto creado exitosamente')
             return redirect('admin_productos')
@@ -385,22 +473,44 @@ def admin_productos_editar(request, producto_id):
             producto.nombre = request.POST.get('nombre')
             producto.descripcion = request.POST.get('descripcion')
             producto.precio = request.POST.get('precio')
-            producto.stock = request.POST.get('stock')
+            if producto.stock_fraccionado:
+                # Solo se aplica lo que el admin cambió respecto al stock que vio:
+                # lo vendido desde entonces sigue descontado
+                stock = int(request.POST.get('stock'))
+                diferencia = stock - int(request.POST.get('stock_mostrado', stock))
+            else:
+                producto.stock = request.POST.get('stock')
             producto.categoria_id = request.POST.get('categoria')
             producto.marca_id = request.POST.get('marca')
             producto.material_id = request.POST.get('material')
             producto.activo = bool(request.POST.get('activo'))
             
+            imagen_anterior = producto.imagen.name
             if 'imagen' in request.FILES:
                 producto.imagen = request.FILES['imagen']
             
+            if producto.stock_fraccionado:
+                if diferencia:
+                    stock_fraccionado.ajustar(producto, diferencia)
+                # La copia de stock y vendidos que se guarda a continuación, al día
+                stock_fraccionado.sincronizar([producto.id])
+                producto.refresh_from_db(fields=['stock', 'vendidos'])
             producto.save()
+            if producto.imagen.name != imagen_anterior:
+                # Con el almacenamiento por contenido otra ficha puede compartir la imagen
+                if imagen_anterior and not Producto.objects.filter(imagen=imagen_anterior).exists():
+                    imagenes.eliminar_derivadas(imagen_anterior)
+                cola_imagenes.encolar(producto)
             messages.success(request, 'Producto actualizado exitosamente')
             return redirect('admin_productos')
             
         except Exception as e:
             messages.error(request, f'Error al actualizar producto: {str(e)}')
     
+    if producto.stock_fraccionado:
+        # El stock guardado en el producto es una copia que puede ir unos segundos por detrás
+        producto.stock = stock_fraccionado.total(producto.id)
+    
     categorias = Categoria.objects.all()
     marcas = Marca.objects.all()
     materiales = Material.objects.all()
@@ -653,7 +763,8 @@ def admin_pedidos_editar(request, pedido_id):
         try:
             estado_anterior = pedido.estado
             pedido.estado = request.POST.get('estado')
-            pedido.save()
+            # Solo el estado: total y líneas se mantienen con UPDATE relativos
+            pedido.save(update_fields=['estado'])
             
             messages.success(request, 'Pedido actualizado exitosamente')
             return redirect('admin_pedidos')
@@ -777,8 +888,7 @@ def es_administrador(request):
 def agregar_favorito(request, producto_id):
     """Agregar producto a favoritos"""
     if request.method == 'POST':
-        usuario_id = request.session.get('usuario_id')
-        usuario = get_object_or_404(Usuario, id=usuario_id)
+        usuario = usuario_o_404(request)
         producto = get_object_or_404(Producto, id=producto_id)
         
         # Verificar si ya existe
@@ -798,8 +908,7 @@ def agregar_favorito(request, producto_id):
 def eliminar_favorito(request, favorito_id):
     """Eliminar producto de favoritos"""
     if request.method == 'POST':
-        usuario_id = request.session.get('usuario_id')
-        usuario = get_object_or_404(Usuario, id=usuario_id)
+        usuario = usuario_o_404(request)
         
         favorito = get_object_or_404(Favorito, id=favorito_id, cliente=usuario)
         favorito.delete()
@@ -812,8 +921,7 @@ def eliminar_favorito(request, favorito_id):
 def agregar_carrito(request, producto_id):
     """Agregar producto al carrito"""
     if request.method == 'POST':
-        usuario_id = request.session.get('usuario_id')
-        usuario = get_object_or_404(Usuario, id=usuario_id)
+        usuario = usuario_o_404(request)
         producto = get_object_or_404(Producto, id=producto_id)
         
         # Verificar stock
@@ -823,42 +931,19 @@ def agregar_carrito(request, producto_id):
                 'message': 'Producto sin stock disponible'
             })
         
-        # Obtener o crear pedido pendiente (carrito)
-        pedido, created = Pedido.objects.get_or_create(
-            cliente=usuario,
-            estado='pendiente',
-            defaults={'total': 0}
-        )
-        
-        # Verificar si el producto ya está en el carrito
-        item, item_created = ItemPedido.objects.get_or_create(
-            pedido=pedido,
-            producto=producto,
-            defaults={
-                'cantidad': 1,
-                'precio_unitario': producto.precio
-            }
-        )
-        
-        if not item_created:
-            # Si ya existe, verificar que no exceda el stock
-            if item.cantidad + 1 > producto.stock:
-                return JsonResponse({
-                    'success': False, 
-                    'message': 'No hay suficiente stock disponible'
-                })
-            item.cantidad += 1
-            item.save()
-        
-        # Actualizar total del pedido
-        total = sum(item.cantidad * item.precio_unitario for item in pedido.items.all())
-        pedido.total = total
-        pedido.save()
+        # Obtener o crear pedido pendiente (carrito) y sumar una unidad (o crear
+        # la línea); el total se actualiza con un UPDATE relativo
+        try:
+            pedido = carrito_compras.obtener_carrito(usuario)
+            carrito_compras.agregar(pedido, producto)
+        except carrito_compras.ErrorCarrito as e:
+            return JsonResponse({'success': False, 'message': str(e)})
         
         return JsonResponse({
             'success': True, 
             'message': 'Producto agregado al carrito',
-            'carrito_count': pedido.items.count()
+            'carrito_count': pedido.cantidad_items,
+            'total': pedido.total
         })
     
     return JsonResponse({'success': False, 'message': 'Método no permitido'})
@@ -867,29 +952,25 @@ def agregar_carrito(request, producto_id):
 def actualizar_carrito(request, item_id):
     """Actualizar cantidad en carrito"""
     if request.method == 'POST':
-        usuario_id = request.session.get('usuario_id')
-        usuario = get_object_or_404(Usuario, id=usuario_id)
+        usuario = usuario_o_404(request)
         
-        item = get_object_or_404(ItemPedido, id=item_id, pedido__cliente=usuario)
+        # Solo artículos del carrito abierto, no de pedidos ya completados
+        item = get_object_or_404(
+            ItemPedido.objects.select_related('pedido'),
+            id=item_id, pedido__cliente=usuario, pedido__estado='pendiente'
+        )
         accion = request.POST.get('accion')
         
-        if accion == 'incrementar':
-            item.cantidad += 1
-        elif accion == 'decrementar' and item.cantidad > 1:
-            item.cantidad -= 1
-        
-        item.save()
-        
-        # Actualizar total del pedido
-        pedido = item.pedido
-        total = sum(item.cantidad * item.precio_unitario for item in pedido.items.all())
-        pedido.total = total
-        pedido.save()
+        try:
+            carrito_compras.cambiar_cantidad(item, accion)
+        except carrito_compras.ErrorCarrito as e:
+            return JsonResponse({'success': False, 'message': str(e)})
         
         return JsonResponse({
             'success': True,
             'nueva_cantidad': item.cantidad,
-            'subtotal': item.cantidad * item.precio_unitario
+            'subtotal': item.cantidad * item.precio_unitario,
+            'total': item.pedido.total
         })
     
     return JsonResponse({'success': False, 'message': 'Método no permitido'})
@@ -898,43 +979,71 @@ def actualizar_carrito(request, item_id):
 def eliminar_del_carrito(request, item_id):
     """Eliminar item del carrito"""
     if request.method == 'POST':
-        usuario_id = request.session.get('usuario_id')
-        usuario = get_object_or_404(Usuario, id=usuario_id)
+        usuario = usuario_o_404(request)
         
-        item = get_object_or_404(ItemPedido, id=item_id, pedido__cliente=usuario)
-        item.delete()
+        item = get_object_or_404(
+            ItemPedido.objects.select_related('pedido'),
+            id=item_id, pedido__cliente=usuario, pedido__estado='pendiente'
+        )
+        carrito_compras.eliminar(item)
         
         return JsonResponse({
             'success': True,
-            'message': 'Producto eliminado del carrito'
+            'message': 'Producto eliminado del carrito',
+            'carrito_count': item.pedido.cantidad_items,
+            'total': item.pedido.total
         })
     
     return JsonResponse({'success': False, 'message': 'Método no permitido'})
 
+@login_required_custom
+def actualizar_carrito_lote(request):
+    """Aplica de una vez varios cambios del carrito enviados como JSON"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Método no permitido'}, status=405)
+    
+    try:
+        operaciones = json.loads(request.body).get('operaciones', [])
+    except (ValueError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Petición no válida'}, status=400)
+    if not isinstance(operaciones, list):
+        return JsonResponse({'success': False, 'message': 'Petición no válida'}, status=400)
+    
+    usuario = usuario_o_404(request)
+    try:
+        pedido = carrito_compras.obtener_carrito(usuario)
+        productos = carrito_compras.aplicar_lote(pedido, operaciones)
+    except carrito_compras.ErrorCarrito as e:
+        return JsonResponse({'success': False, 'message': str(e)})
+    
+    return JsonResponse({
+        'success': True,
+        'productos': productos,
+        'carrito_count': pedido.cantidad_items,
+        'total': pedido.total
+    })
+
 @login_required_custom
 def pago(request):
     """Pasarela de pago"""
-    usuario_id = request.session.get('usuario_id')
-    usuario = get_object_or_404(Usuario, id=usuario_id)
+    usuario = usuario_o_404(request)
     
     # Obtener el pedido pendiente (carrito)
     pedido = get_object_or_404(Pedido, cliente=usuario, estado='pendiente')
-    items = pedido.items.all()
     
     # Verificar que el carrito no esté vacío
-    if items.count() == 0:
+    if pedido.cantidad_items == 0:
         messages.error(request, 'Tu carrito está vacío')
         return redirect('carrito')
     
-    # Calcular totales
-    subtotal = sum(item.cantidad * item.precio_unitario for item in items)
-    total = subtotal
+    items = pedido.items.select_related('producto')
     
     context = {
         'items': items,
         'pedido': pedido,
-        'subtotal': subtotal,
-        'total': total,
+        'subtotal': pedido.total,
+        'total': pedido.total,
+        'clave_pago': checkout.nueva_clave(),
     }
     return render(request, 'pago.html', context)
 
@@ -942,32 +1051,18 @@ def pago(request):
 def procesar_pago(request):
     """Procesar el pago y completar el pedido"""
     if request.method == 'POST':
-        usuario_id = request.session.get('usuario_id')
-        usuario = get_object_or_404(Usuario, id=usuario_id)
+        usuario = usuario_o_404(request)
         
-        # Obtener el pedido pendiente (carrito)
-        pedido = get_object_or_404(Pedido, cliente=usuario, estado='pendiente')
-        
-        # Verificar que el carrito no esté vacío
-        if pedido.items.count() == 0:
-            messages.error(request, 'Tu carrito está vacío')
+        # Descuenta el stock y completa el carrito en una sola transacción. Con la
+        # clave del formulario, un envío repetido recibe el resultado del primero
+        try:
+            solicitud = checkout.pagar(usuario, request.POST.get('clave_pago', '')[:64])
+        except checkout.ErrorCheckout as e:
+            messages.error(request, str(e))
+            return redirect('carrito')
+        if solicitud.resultado != 'completado':
+            messages.error(request, solicitud.mensaje)
             return redirect('carrito')
-        
-        # Verificar stock de productos
-        for item in pedido.items.all():
-            if item.cantidad > item.producto.stock:
-                messages.error(request, f'No hay suficiente stock de {item.producto.nombre}')
-                return redirect('carrito')
-        
-        # Actualizar stock y cambiar estado del pedido
-        for item in pedido.items.all():
-            producto = item.producto
-            producto.stock -= item.cantidad
-            producto.save()
-        
-        # Cambiar estado a "completado" (pedido real)
-        pedido.estado = 'completado'
-        pedido.save()
         
         messages.success(request, '¡Pago procesado exitosamente! Tu pedido ha sido confirmado.')
         return redirect('historial_pedidos')
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'app_luzzen.middleware.UsuarioActualMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -81,6 +83,19 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Las transacciones toman el bloqueo de escritura al empezar: dos
+            # compras simultáneas esperan su turno en vez de fallar con
+            # "database is locked" al pasar de lectura a escritura
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # Las pruebas usan un archivo y no la base en memoria: con varios hilos,
+        # la base en memoria compartida falla con "database table is locked"
+        # en vez de esperar como un archivo normal
+        'TEST': {
+            'NAME': os.path.join(tempfile.gettempdir(), 'luzzen_test.sqlite3'),
+        },
     }
 }
 
@@ -142,14 +157,64 @@ STATICFILES_DIRS = [
 # Directorio donde se recogen los archivos estáticos para producción
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# collectstatic añade el hash del contenido a cada nombre y genera copias .gz
+# (y .br si está instalado el paquete brotli) que sirve app_luzzen.archivos.
+# Con DEBUG = False hay que ejecutarlo en cada despliegue; sin él las páginas
+# no fallan, pero enlazan los nombres sin hash y no hay nada que servir
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'app_luzzen.almacenamiento.EstaticosComprimidos',
+    },
+}
+
 # Archivos media (imágenes subidas)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Configuración de sesiones (para el carrito de compras)
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Cachés en archivos, compartidas por todos los procesos del servidor (workers y
+# comandos): lo que uno invalida deja de verse en los demás. Con varios
+# servidores se cambiaría por una caché en red (Redis, Memcached).
+# CacheArchivos solo recuenta las entradas cada LIMPIAR_CADA escrituras
+CACHES = {
+    # Fragmentos, páginas y datos de las vistas
+    'default': {
+        'BACKEND': 'app_luzzen.cache_archivos.CacheArchivos',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'luzzen_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 50000, 'LIMPIAR_CADA': 1000},
+    },
+    # Sellos de versión (catálogo, autocompletado): pocas claves que nunca se
+    # borran, porque perder una invalida todo lo que depende de ella
+    'versiones': {
+        'BACKEND': 'app_luzzen.cache_archivos.CacheArchivos',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'luzzen_versiones'),
+        'OPTIONS': {'LIMPIAR_CADA': 0},
+    },
+    'sesiones': {
+        'BACKEND': 'app_luzzen.cache_archivos.CacheArchivos',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'luzzen_sesiones'),
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'LIMPIAR_CADA': 1000},
+    },
+}
+
+# Configuración de sesiones (para el carrito de compras). Se elige con la
+# variable de entorno LUZZEN_SESIONES:
+# - 'cache': en la base de datos, pero se leen de la caché 'sesiones' (por defecto)
+# - 'cookie': firmadas en la propia cookie, sin base de datos. El contenido
+#   (usuario_id, nombre, email, es_admin) es legible, aunque no modificable,
+#   y cerrar sesión no invalida copias anteriores de la cookie
+# - 'db': solo base de datos, una consulta en cada petición
+MOTORES_SESION = {
+    'cache': 'django.contrib.sessions.backends.cached_db',
+    'cookie': 'django.contrib.sessions.backends.signed_cookies',
+    'db': 'django.contrib.sessions.backends.db',
+}
+SESSION_ENGINE = MOTORES_SESION[os.environ.get('LUZZEN_SESIONES', 'cache')]
+SESSION_CACHE_ALIAS = 'sesiones'
 SESSION_COOKIE_AGE = 1209600  # 2 semanas en segundos
 
 # Configuración de login (si decides usar el sistema de autenticación de Django más adelante)
@@ -160,5 +225,6 @@ LOGOUT_REDIRECT_URL = '/'
 # Configuración de email (para desarrollo)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
-# Si quieres deshabilitar el framework de mensajes, puedes comentar esta línea
-MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
\ No newline at end of file
+# Si quieres deshabilitar el framework de mensajes, puedes comentar esta línea.
+# Los mensajes viajan en una cookie firmada: mostrarlos no obliga a guardar la sesión
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
\ No newline at end of file
@@ -1,14 +1,16 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from app_luzzen.archivos import servir_estatico, servir_media
 
 urlpatterns = [
     path('', include('app_luzzen.urls')),
     path('admin/', admin.site.urls),
-]
-
-# Servir archivos estáticos y media en desarrollo
-if settings.DEBUG:
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Imágenes subidas con ETag, 304, rangos y caché larga para nombres con hash
+    re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<ruta>.+)$', servir_media, name='media'),
+    # Estáticos de collectstatic, precomprimidos. Con DEBUG, runserver los sirve
+    # antes desde las carpetas de origen (salvo con --nostatic)
+    re_path(rf'^{re.escape(settings.STATIC_URL.lstrip("/"))}(?P<ruta>.+)$', servir_estatico, name='estaticos'),
+]
\ No newline at end of file